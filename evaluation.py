@@ -1,15 +1,29 @@
-import json, pathlib, statistics, os
-from collections import defaultdict
+import argparse, heapq, json, pathlib, statistics, os, tempfile, time
+from collections import defaultdict, deque
+from concurrent.futures import ProcessPoolExecutor
 # import counters for actual count
-from helpers.counting import word_count, paragraph_count, line_count
+from helpers.counting import measure_batch
+from helpers.parts import slice_part_views, scan_parts
+from helpers.cache import COUNTER_VERSION, CountCache
+from helpers.records import RecordDecoder, load_prompts_table, prompts_table_path
+from helpers.part_table import PART_DTYPE, PartTableSpool, build_part_table, save_part_table
+from helpers.manifest import Manifest
+from helpers.aggregates import OUTPUT_ROW, Aggregate, AggregateTable
+from helpers.pack import PackedCorpus, pack_is_fresh, write_pack
+from helpers.storage import copy_range, find_variant, is_compressed, open_stream, plain_path, skip_to
 # import different metric functions
-from helpers.metrics import parse_target
-from helpers.metrics import hard_metric # from helpers.metrics import soft_metric_basic, soft_metric_advanced  
+from helpers.metrics import ConstraintPlan, compile_plan, RELATION_CODES, METRICS, DEFAULT_METRICS
+from helpers.metrics import relative_deviation, grouped_tolerance_curves
 import re
+import numpy as np
 
 # constants declaration
 DATA_DIR = pathlib.Path("data")
 OUTDIR = pathlib.Path("eval")
+# --shard results, until `evaluation.py merge` combines them into OUTDIR
+SHARD_DIR = OUTDIR / "shards"
+# every prompt's verification spec, as generation.py read it
+PROMPTS_FILE = DATA_DIR / "segmented.jsonl"
 
 MODEL_FILES = [
     DATA_DIR / "deepseek-v3_output.jsonl",
@@ -17,140 +31,505 @@ MODEL_FILES = [
     DATA_DIR / "llama4scout_output.jsonl",
 ]
 
+# tolerances reported by --sweep, 0% to 50% in 0.5% steps
+TOLERANCE_GRID = np.linspace(0.0, 0.5, 101)
 
-LEVEL_COUNTERS = {
-    "word": word_count,
-    "paragraph": paragraph_count,
-    "line": line_count,
-}
+# records per sorted run when an unordered output file has to be regrouped
+SORT_RUN_RECORDS = 5000
+# generation.py writes prompt_id first, so it can be read without a full parse
+PROMPT_ID_RE = re.compile(rb'\{\s*"prompt_id"\s*:\s*"?(\d+)"?\s*[,}]')
+# prompt_id is the first key of an eval record, on the line after its brace
+RECORD_PID_RE = re.compile(r'\s*"prompt_id": (\d+),')
+# what write_eval() ends an eval JSON with after its last record
+RECORDS_CLOSE = b"\n  ]\n}"
+
+# prompts handed to a worker at a time with --workers
+PROMPTS_PER_CHUNK = 32
+
+# --follow: seconds between checks for new lines, and samples in the recent pass rate
+FOLLOW_POLL = 0.05
+FOLLOW_WINDOW = 50
 
 # ---------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------
-# pass in the output file
-def load_model_outputs(jsonl_path: pathlib.Path):
-    # create a dictionary, store all the output under this single pid
-    per_prompt = defaultdict(list)
-    with jsonl_path.open("r", encoding="utf-8") as f:
+def load_plan_table(prompts_path: pathlib.Path = PROMPTS_FILE):
+    """{pid: (verification, ConstraintPlan)} for every prompt, compiled once.
+
+    Shared by all model files; empty when the prompts file is missing, and
+    then each model compiles the specs its records carry.
+    """
+    plans = {}
+    prompts_path = find_variant(prompts_path)
+    if not prompts_path.exists():
+        return plans
+    with open_stream(prompts_path, "r") as f:
         for line in f:
-            if not line.strip():
-                continue
-            obj = json.loads(line)
-            pid = int(obj["prompt_id"])
-            per_prompt[pid].append(obj)
-    return per_prompt
-
-"""Split content into numbered parts using '#part n' headers."""
-def slice_parts(content: str):
-    # get the number after part tag
-    part_header_re = re.compile(r"(?mi)^#part\s*(\d+)\s*$")
-    headers = list(part_header_re.finditer(content))
-    if not headers:
-        return {}
-    parts = {}
-    # part and content
-    for j, hdr in enumerate(headers):
-        n = int(hdr.group(1))   # get the number
-        s = hdr.end()   # part 
-        e = headers[j + 1].start() if j + 1 < len(headers) else len(content)
-        parts[n] = content[s:e].strip()
-    return parts
-
-
-def measure(level: str, text: str) -> int:
-    counter = LEVEL_COUNTERS.get(level)
-    return counter(text) if counter else 0
-
-# input relation and actual and target
-def part_scores(relation: str, actual: int, target):
-    """Return per-part metric dictionary."""
-    hard = float(hard_metric(relation, actual, target))
-    # soft_basic = soft_metric_basic(relation, actual, target)
-    # soft_advanced = soft_metric_advanced(relation, actual, target)
-    return {
-        "hard": hard,
-        # "soft_basic": soft_basic,
-        # "soft_advanced": soft_advanced
-    }
+            if line.strip():
+                row = json.loads(line)
+                vtag = row.get("verification")
+                if vtag:
+                    plans[int(row["prompt_id"])] = (vtag, compile_plan(vtag))
+    return plans
 
+def plan_for(pid: int, vtag: dict, plans: dict = None) -> ConstraintPlan:
+    # the shared plan, unless this file carries a different spec for pid;
+    # RecordDecoder interns specs, so once a plan is stored under a record's
+    # spec the later records of the prompt match it by identity
+    entry = plans.get(pid) if plans else None
+    if entry is not None and (entry[0] is vtag or entry[0] == vtag):
+        return entry[1]
+    return compile_plan(vtag)
+
+def record_prompt_id(line: bytes) -> int:
+    m = PROMPT_ID_RE.match(line)
+    return int(m.group(1)) if m else int(json.loads(line)["prompt_id"])
+
+# yield (pid, raw line) for every non-blank record, in file order; start and
+# stop are byte offsets of line starts, to read only part of the file, and
+# pids limits it to those prompts' records
+def iter_raw_records(jsonl_path: pathlib.Path, start: int = 0, stop: int = None, pids: set = None):
+    # .gz/.xz/.zst files are decompressed as they are read
+    with open_stream(jsonl_path, "rb") as f:
+        if start:
+            skip_to(f, start)
+        pos = start
+        for line in f:
+            if stop is not None and pos >= stop:
+                break
+            pos += len(line)
+            if line.strip():
+                pid = record_prompt_id(line)
+                if pids is None or pid in pids:
+                    yield pid, line
+
+def is_grouped(jsonl_path: pathlib.Path, start: int = 0, stop: int = None, pids: set = None) -> bool:
+    """True when every prompt's records sit next to each other in the file."""
+    seen, prev = set(), None
+    for pid, _ in iter_raw_records(jsonl_path, start, stop, pids):
+        if pid != prev:
+            if pid in seen:
+                return False
+            seen.add(pid)
+            prev = pid
+    return True
+
+def external_sort(jsonl_path: pathlib.Path, run_size: int = SORT_RUN_RECORDS, start: int = 0, stop: int = None,
+                  pids: set = None):
+    """Yield (pid, raw line) grouped by prompt, prompts in order of first
+    appearance and records in file order, holding one run in memory."""
+    rank = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        runs = []
+
+        def spill(batch):
+            batch.sort()
+            path = pathlib.Path(tmp) / f"run{len(runs)}"
+            with path.open("wb") as out:
+                for r, i, line in batch:
+                    out.write(b"%d %d " % (r, i) + line.rstrip(b"\n") + b"\n")
+            runs.append(path)
+
+        batch = []
+        for i, (pid, line) in enumerate(iter_raw_records(jsonl_path, start, stop, pids)):
+            batch.append((rank.setdefault(pid, len(rank)), i, line))
+            if len(batch) >= run_size:
+                spill(batch)
+                batch = []
+        if batch:
+            spill(batch)
+
+        pids = list(rank)
+        files = [path.open("rb") for path in runs]
+        try:
+            streams = [(line.split(b" ", 2) for line in f) for f in files]
+            for r, _, line in heapq.merge(*streams, key=lambda t: (int(t[0]), int(t[1]))):
+                yield pids[int(r)], line
+        finally:
+            for f in files:
+                f.close()
+
+def pack_path(jsonl_path: pathlib.Path) -> pathlib.Path:
+    return plain_path(jsonl_path).with_suffix(".pack")
+
+def readable_pack(jsonl_path: pathlib.Path, start: int = 0, stop: int = None) -> pathlib.Path:
+    """The file's pack if it is up to date and the whole file is read, else
+    None: a byte range of the file is always read from the JSONL."""
+    if not start and stop is None and pack_is_fresh(pack_path(jsonl_path), jsonl_path):
+        return pack_path(jsonl_path)
+    return None
+
+def iter_model_groups(jsonl_path: pathlib.Path, start: int = 0, stop: int = None, pids: set = None):
+    """Yield (pid, records, views) per prompt, from the file's pack when
+    readable_pack() allows it (views are its stored part spans), else from
+    the JSONL itself with views None."""
+    pack = readable_pack(jsonl_path, start, stop)
+    if pack:
+        corpus = PackedCorpus(pack)
+        try:
+            yield from corpus.groups(pids)
+        finally:
+            corpus.close()
+    else:
+        for pid, records in iter_prompt_groups(jsonl_path, start, stop, pids):
+            yield pid, records, None
+
+def iter_prompt_groups(jsonl_path: pathlib.Path, start: int = 0, stop: int = None, pids: set = None):
+    """Yield (pid, records) one prompt at a time, records in file order.
+
+    generation.py writes each prompt's samples together, so one streaming
+    pass is enough; an unordered file is regrouped by an external sort.
+    Either way only one prompt's records are decoded at a time, and prompts
+    come out in order of first appearance.
+    """
+    if is_grouped(jsonl_path, start, stop, pids):
+        raw = iter_raw_records(jsonl_path, start, stop, pids)
+    else:
+        raw = external_sort(jsonl_path, start=start, stop=stop, pids=pids)
+    decoder = RecordDecoder(load_prompts_table(jsonl_path))
+    pid, records = None, []
+    for rec_pid, line in raw:
+        if rec_pid != pid and records:
+            yield pid, records
+            records = []
+        pid = rec_pid
+        records.append(decoder.decode(rec_pid, line))
+    if records:
+        yield pid, records
+
+def score_outputs(plan: ConstraintPlan, measured, metrics=DEFAULT_METRICS):
+    """Score every output of one prompt against its compiled plan at once.
+
+    measured holds one {part: count} dict per output; each metric in the
+    registry is one array op over the whole (outputs, parts) grid.
+    """
+    actual = [[m[k] for k in range(1, plan.parts + 1)] for m in measured]
+    grid = np.array(actual, dtype=np.int64).reshape(len(actual), plan.parts)
+    rows = {name: vals.tolist() for name, vals in plan.scores(grid, metrics).items()}
+    results = []
+    for j, counts in enumerate(actual):
+        part_results = {}
+        metric_bins = {name: vals[j] for name, vals in rows.items()}
+        for k, count in enumerate(counts, start=1):
+            part_results[k] = {
+                "level": plan.levels[k - 1],
+                "relation": plan.relations[k - 1],
+                "target": plan.targets[k - 1],
+                "measured": count,
+                "scores": {key: vals[k - 1] for key, vals in metric_bins.items()}
+            }
+        sample_scores = {k: statistics.mean(v) if v else 0.0 for k, v in metric_bins.items()}   # output score
+        output_pass = sample_scores["hard"] == 1.0  # output pass
+        results.append({
+            "part_results": part_results,
+            "output_pass": output_pass,
+            "sample_scores": sample_scores
+        })
+    return results
+
+
+# for one single output, measured maps part -> count when already counted
+def verify_output(content: str, vtag: dict, measured: dict = None, plan: ConstraintPlan = None,
+                  metrics=DEFAULT_METRICS):
+    if plan is None:
+        plan = compile_plan(vtag)
+    if measured is None:
+        # slice and count in one pass over content
+        stats = scan_parts(content)
+        measured = {k: stats[k].count(plan.levels[k - 1]) for k in range(1, plan.parts + 1)}
+    return score_outputs(plan, [measured], metrics)[0]
+
+
+def measure_model_parts(per_prompt, plans: dict, cache: CountCache = None, views: dict = None):
+    """Slice every output of a model, then count all parts in one batch.
+
+    Returns {pid: [{part: count} per output]} in record order. With a cache
+    only the parts it has not seen before are counted. views, when given,
+    holds the already sliced {part: PartView} of each output, per pid.
+
+    scan_parts() slices and counts in one pass, but walks each line in
+    Python; over many outputs the vectorised counters are about twice as
+    fast, so it is only used for single outputs (verify_output).
+    """
+    jobs, keys = [], []
+    for pid, records in per_prompt.items():
+        plan = plans[pid]
+        for j, obj in enumerate(records):
+            # views point into the output, no per-part copies
+            parts = views[pid][j] if views and pid in views else slice_part_views(obj.output)
+            for k in range(1, plan.parts + 1):
+                jobs.append((plan.levels[k - 1], parts[k]))
+                keys.append((pid, j, k))
+    measured = {pid: [{} for _ in records] for pid, records in per_prompt.items()}
+    counts = cache.measure(jobs, measure_batch) if cache else measure_batch(jobs)
+    for (pid, j, k), count in zip(keys, counts):
+        measured[pid][j][k] = count
+    return measured
 
-# for one single output
-def verify_output(content: str, vtag: dict):
-    exp_n = int(vtag["part_number"])
-    parts = slice_parts(content)
-    part_results = {}
-    metric_bins = {"hard": []}
-    # iterate through the parts
-    for k in range(1, exp_n + 1):
-        spec = vtag[str(k)]
-        level = spec["level"]
-        relation = spec["relation"]
-        target_raw = spec["target"]
-        actual = measure(level, parts[k])
-        target = parse_target(relation, target_raw)
-        # score of one part
-        scores = part_scores(relation, actual, target)
-        for key, val in scores.items():
-            metric_bins[key].append(val)
-        part_results[k] = {
-            "level": level,
-            "relation": relation,
-            "target": target_raw,
-            "measured": actual,
-            "scores": scores
-        }
 
-    sample_scores = {k: statistics.mean(v) if v else 0.0 for k, v in metric_bins.items()}   # output score
-    output_pass = sample_scores["hard"] == 1.0  # output pass
+def tolerance_sweep(table: np.ndarray, tolerances=TOLERANCE_GRID):
+    """Part pass rates over a grid of tolerances, per relation and prompt.
 
+    Uses the counts already measured in the part table, so a whole curve
+    costs one deviation pass and one sort instead of one run per tolerance.
+    """
+    pids = table["prompt_id"].astype(np.int64)
+    codes = table["relation"].astype(np.int64)
+    dev = relative_deviation(codes, table["measured"], table["lo"], table["hi"])
+    names = {code: rel for rel, code in RELATION_CODES.items()}
+
+    by_relation = grouped_tolerance_curves(codes, dev, tolerances)
+    # one key per (prompt, relation) pair
+    width = len(RELATION_CODES) + 1
+    by_prompt = defaultdict(dict)
+    for key, curve in grouped_tolerance_curves(pids * width + codes + 1, dev, tolerances).items():
+        pid, code = divmod(key, width)
+        by_prompt[pid][names.get(code - 1, "unknown")] = curve.tolist()
     return {
-        "part_results": part_results,
-        "output_pass": output_pass,
-        "sample_scores": sample_scores
+        "tolerances": np.asarray(tolerances).tolist(),
+        "by_relation": {names.get(c, "unknown"): curve.tolist() for c, curve in by_relation.items()},
+        "by_prompt": dict(by_prompt),
     }
 
 
-def evaluate_model_file(model_jsonl: pathlib.Path):
-    model_name = model_jsonl.stem
-    per_prompt = load_model_outputs(model_jsonl)
-    prompt_pass_rate = {}
-    prompt_accuracy = {}
-    per_output = []
-    # for a single prompt
-    for pid, records in per_prompt.items():
-        metric_sums = {"hard": []}
-        vtag = records[0]["verification"]
+def format_record(rec: dict) -> str:
+    """rec as RecordSpool writes it: indented JSON, one level into the list."""
+    return "    " + json.dumps(rec, ensure_ascii=False, indent=2).replace("\n", "\n    ")
 
-        total_outputs = len(records)
-        pass_outputs = 0
-        # for a single output
-        for j, obj in enumerate(records, start=1):
-            content = obj["output"]
-            res = verify_output(content, vtag)
 
-            if res["output_pass"]:
-                pass_outputs += 1
+def iter_record_texts(eval_path: pathlib.Path, key: str = "per_output_records"):
+    """Yield (pid, text) for each record of an eval JSON write_eval() wrote,
+    text formatted as format_record() formats it, without parsing."""
+    opened = f'  "{key}": [\n'
+    with eval_path.open(encoding="utf-8", newline="") as f:
+        for line in f:
+            if line == opened:
+                break
+        else:
+            return    # "key": [], no records
+        lines = []
+        for line in f:
+            if line == "  ]\n":
+                break
+            lines.append(line[:-1])
+            # a record closes at its own indent, followed by a comma unless last
+            if line in ("    }\n", "    },\n"):
+                lines[-1] = "    }"
+                yield int(RECORD_PID_RE.match(lines[1]).group(1)), "\n".join(lines)
+                lines = []
+
+
+class RecordSpool:
+    """Per-output records streamed to a temp file as they are scored.
+
+    write_eval() then emits exactly what json.dumps(res, indent=2) gives for
+    res with these records as its last key, without holding them in memory.
+    After resume() the records of an earlier eval JSON come first, copied
+    over by write_eval() without being read.
+    """
+
+    def __init__(self):
+        self.tmp = tempfile.TemporaryFile("w+", encoding="utf-8")
+        self.count = 0
+        self.base = None    # (path, start, length) of the earlier records
+
+    def append(self, rec: dict):
+        self.append_text(format_record(rec))
+
+    def write_eval(self, res: dict, out_path: pathlib.Path, key: str = "per_output_records"):
+        head = json.dumps(res, ensure_ascii=False, indent=2)
+        # written next to out_path and renamed over it: the earlier records may be in out_path itself
+        tmp_path = out_path.with_name(out_path.name + ".tmp")
+        with tmp_path.open("wb") as out:
+            if not self.count:
+                out.write((head[:-2] + f',\n  "{key}": []\n}}').encode("utf-8"))
+            else:
+                out.write((head[:-2] + f',\n  "{key}": [\n').encode("utf-8"))
+                if self.base:
+                    copy_range(*self.base, out)
+                self.tmp.seek(0)
+                while True:
+                    chunk = self.tmp.read(1 << 20)
+                    if not chunk:
+                        break
+                    out.write(chunk.encode("utf-8"))
+                out.write(RECORDS_CLOSE)
+        os.replace(tmp_path, out_path)
+
+    def append_text(self, text: str):
+        """Append a record already formatted by format_record(), as iter_record_texts() yields it."""
+        self.tmp.write((",\n" if self.count else "") + text)
+        self.count += 1
+
+    def resume(self, eval_path: pathlib.Path, count: int, key: str = "per_output_records"):
+        """Continue after the count records of an eval JSON write_eval() wrote.
+
+        Only the JSON's head is read, to find where its records start.
+        """
+        opened = f'  "{key}": [\n'.encode("utf-8")
+        start = 0
+        with eval_path.open("rb") as f:
+            for line in f:
+                start += len(line)
+                if line == opened:
+                    break
+            else:
+                return    # "key": [], no records
+        self.base = (eval_path, start, eval_path.stat().st_size - len(RECORDS_CLOSE) - start)
+        self.count = count
 
-            per_output.append({
+    def clear(self):
+        self.tmp.seek(0)
+        self.tmp.truncate()
+        self.count = 0
+        self.base = None
+
+    def close(self):
+        self.tmp.close()
+
+
+def score_prompt_groups(groups, cache: CountCache = None, metrics=DEFAULT_METRICS, plans: dict = None,
+                        bins: int = 0, as_text: bool = False):
+    """Score a window of (pid, records, views) prompt groups.
+
+    Every part in the window is counted in one batched call. Returns
+    (pid, rows, per-output records, part table) per group, in order; rows
+    maps OUTPUT_ROW and each (level, relation, part) to the prompt's
+    Aggregate for it. With as_text the records come already formatted by
+    format_record(), so a --workers pool formats them in the workers.
+    """
+    # parse each prompt's verification spec once, not once per sample,
+    # or take it from the shared plan table
+    window_plans = {pid: plan_for(pid, records[0].verification, plans) for pid, records, _ in groups}
+    views = {pid: group_views for pid, _, group_views in groups if group_views is not None}
+    measured = measure_model_parts({pid: records for pid, records, _ in groups}, window_plans, cache, views)
+
+    results = []
+    for pid, _, _ in groups:
+        plan = window_plans[pid]
+        table = build_part_table({pid: plan}, {pid: measured[pid]})
+        rows = {OUTPUT_ROW: Aggregate(bins=bins)}
+        recs = []
+        # for a single output
+        for j, res in enumerate(score_outputs(plan, measured[pid], metrics), start=1):
+            rec = {
                 "prompt_id": pid,
                 "output_idx": j,
                 "pass": int(res["output_pass"]),
                 "sample_scores": res["sample_scores"],
                 "part_results": res["part_results"]
-            })
+            }
+            recs.append(format_record(rec) if as_text else rec)
 
-            for metric, val in res["sample_scores"].items():
-                metric_sums.setdefault(metric, []).append(val)
+            # mergeable totals instead of lists of scores
+            rows[OUTPUT_ROW].add(res["output_pass"], res["sample_scores"])
+            for k, part in res["part_results"].items():
+                key = (part["level"], part["relation"], k)
+                if key not in rows:
+                    rows[key] = Aggregate(bins=bins)
+                rows[key].add(part["scores"]["hard"] == 1.0, part["scores"])
+        results.append((pid, rows, recs, table))
+    return results
+
+
+def iter_chunks(items, size: int):
+    """Yield lists of up to size consecutive items."""
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+# what a --workers process keeps between chunks, set up by init_worker
+WORKER = {"cache": None, "corpus": None}
+
+
+def init_worker(cache_path: pathlib.Path = None, pack: pathlib.Path = None):
+    """Pool initializer: one cache connection and one open pack per worker,
+    not per chunk."""
+    WORKER["cache"] = CountCache(cache_path, owner=False) if cache_path else None
+    WORKER["corpus"] = PackedCorpus(pack) if pack else None
 
-        prompt_pass_rate[pid] = pass_outputs / total_outputs if total_outputs else 0.0
-        prompt_accuracy[pid] = {
-            m: statistics.mean(v) if v else 0.0 for m, v in metric_sums.items()
-        }
+
+def score_prompt_chunk(chunk, metrics=DEFAULT_METRICS, plans: dict = None, bins: int = 0, as_text: bool = False):
+    """Worker side of --workers: score a chunk of prompts.
+
+    The chunk holds (pid, records, views) groups, or (pid, lo, hi) sample
+    ranges of the worker's pack when it has one, so outputs are read from
+    the pack's shared pages instead of being pickled over. The worker
+    commits its new counts after each chunk.
+    """
+    cache, corpus = WORKER["cache"], WORKER["corpus"]
+    if corpus:
+        chunk = [corpus.group(lo, hi) for _, lo, hi in chunk]
+    results = score_prompt_groups(chunk, cache, metrics, plans, bins, as_text)
+    if cache:
+        cache.conn.commit()
+    return results
+
+
+def iter_scored_groups(model_jsonl: pathlib.Path, cache: CountCache = None, metrics=DEFAULT_METRICS,
+                       workers: int = 1, chunk_size: int = PROMPTS_PER_CHUNK, plans: dict = None,
+                       start: int = 0, stop: int = None, pids: set = None, bins: int = 0,
+                       as_text: bool = False):
+    """Yield (pid, rows, records, table) per prompt, in file order.
+
+    Prompts are scored in chunks of chunk_size, each counted in one batch.
+    With workers > 1 a process pool scores the chunks; results are still
+    yielded in file order, and at most two chunks per worker are read
+    ahead of the one being merged.
+    """
+    if workers <= 1:
+        for chunk in iter_chunks(iter_model_groups(model_jsonl, start, stop, pids), chunk_size):
+            results = score_prompt_groups(chunk, cache, metrics, plans, bins, as_text)
+            # commit per chunk, as the workers do: a --concurrent process
+            # scoring a whole model must not hold the write lock throughout
+            if cache:
+                cache.conn.commit()
+            yield from results
+        return
+
+    pack = readable_pack(model_jsonl, start, stop)
+    if pack:
+        # workers read the outputs from the pack themselves
+        corpus = PackedCorpus(pack)
+        try:
+            chunks = iter_chunks(list(corpus.bounds(pids)), chunk_size)
+        finally:
+            corpus.close()
+    else:
+        chunks = iter_chunks(iter_model_groups(model_jsonl, start, stop, pids), chunk_size)
+
+    def submit(chunk):
+        # only the chunk's own plans travel with it
+        chunk_plans = {item[0]: plans[item[0]] for item in chunk if item[0] in plans} if plans else None
+        return pool.submit(score_prompt_chunk, chunk, metrics, chunk_plans, bins, as_text)
+
+    cache_path = cache.path if cache else None
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(cache_path, pack)) as pool:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(submit(chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def summarize_model(model_name: str, prompts: dict) -> dict:
+    """The eval summary of a model from its {pid: output-level Aggregate}."""
+    prompt_pass_rate = {pid: agg.pass_rate() for pid, agg in prompts.items()}
+    prompt_accuracy = {pid: agg.means() for pid, agg in prompts.items()}
+    accuracy = next(reversed(prompt_accuracy.values()), {})
 
     model_accuracy = {
         metric: statistics.mean([v[metric] for v in prompt_accuracy.values()])
         if prompt_accuracy else 0.0
-        for metric in metric_sums
+        for metric in accuracy
     }
     model_accuracy["prompt_pass_rate"] = statistics.mean(
         [v for v in prompt_pass_rate.values()]
@@ -161,26 +540,476 @@ def evaluate_model_file(model_jsonl: pathlib.Path):
         "prompt_pass_rate": prompt_pass_rate,
         "prompt_accuracy": prompt_accuracy,
         "model_accuracy": model_accuracy,
-        "per_output_records": per_output
     }
 
 
+def evaluate_model_file(model_jsonl: pathlib.Path, cache: CountCache = None, sweep: bool = False,
+                        metrics=DEFAULT_METRICS, spool: RecordSpool = None, workers: int = 1,
+                        plans: dict = None, aggregates: AggregateTable = None, start: int = 0,
+                        stop: int = None, part_spool: PartTableSpool = None, pids: set = None):
+    """Score one model file, one chunk of prompt groups at a time.
+
+    Per-output records go to spool when one is given, otherwise they are
+    returned under "per_output_records". Part table rows likewise go to
+    part_spool, or are returned under "part_table". workers > 1 scores
+    prompt chunks in parallel; the result is the same as the serial run.
+    plans is the shared table from load_plan_table(); pids, when given,
+    limits scoring to those prompts (--shard).
+
+    Scores are summed into aggregates (a new AggregateTable if None),
+    returned under "aggregates"; the per-prompt and model numbers come from
+    them. For --incremental, only the bytes [start, stop) are scored, and
+    aggregates and the spools already hold what the records before start
+    scored to.
+    """
+    model_name = plain_path(model_jsonl).stem
+    if aggregates is None:
+        aggregates = AggregateTable()
+    tables = []
+    per_output = []
+    # records bound for the spool come back as text, formatted where they were scored
+    scored = iter_scored_groups(model_jsonl, cache, metrics, workers, plans=plans, start=start, stop=stop,
+                                pids=pids, bins=aggregates.bins, as_text=spool is not None)
+    for pid, rows, recs, table in scored:
+        done = aggregates.rows.get((model_name, pid, *OUTPUT_ROW))
+        if done is not None and done.count:
+            # the last --incremental run ended inside this prompt; number on from its outputs
+            table["output_idx"] += done.count
+            if spool is not None:
+                recs = [json.loads(text) for text in recs]
+            for rec in recs:
+                rec["output_idx"] += done.count
+            if spool is not None:
+                recs = [format_record(rec) for rec in recs]
+        for key, agg in rows.items():
+            aggregates.merge_row((model_name, pid, *key), agg)
+        if part_spool is not None:
+            part_spool.append(table)
+        else:
+            tables.append(table)
+        for rec in recs:
+            if spool is not None:
+                spool.append_text(rec)
+            else:
+                per_output.append(rec)
+
+    res = summarize_model(model_name, aggregates.prompts(model_name))
+    if spool is None:
+        res["per_output_records"] = per_output
+    # columnar copy of every part result, written next to the JSON
+    if part_spool is None:
+        res["part_table"] = np.concatenate(tables) if tables else np.zeros(0, dtype=PART_DTYPE)
+    res["aggregates"] = aggregates
+    if sweep:
+        res["tolerance_sweep"] = tolerance_sweep(part_spool.table() if part_spool is not None else res["part_table"])
+    return res
+
+
+def resume_incremental(mf: pathlib.Path, metrics, spool: RecordSpool, part_spool: PartTableSpool, bins: int = 0):
+    """Find where the last --incremental run of mf stopped.
+
+    Returns (manifest, scanned, aggregates): the manifest of what is already
+    scored, that of the file up to its last complete line, and the
+    aggregates already scored, with spool and part_spool continuing after
+    the records and part rows already written. When the earlier results
+    can't be extended, e.g. because the file was rewritten, the manifest
+    and aggregates are empty, so everything is rescored.
+    """
+    model = plain_path(mf).stem
+    out_path, parts_path = OUTDIR / f"{model}_eval.json", OUTDIR / f"{model}_parts.npy"
+    aggregates_path = OUTDIR / f"{model}_aggregates.json"
+    manifest = Manifest.load(OUTDIR / f"{model}_manifest.json")
+    reason = None
+    if manifest is None:
+        pass
+    elif not manifest.matches(metrics, bins):
+        reason = "scored with other metrics, counters or histogram bins"
+    elif not manifest.results_match((out_path, parts_path, aggregates_path)):
+        reason = "earlier results are missing or were changed since"
+    elif (scanned := manifest.scan(mf)) is None:
+        reason = "file was rewritten, not appended to"
+    else:
+        aggregates = AggregateTable.load(aggregates_path)
+        prompts = aggregates.prompts(model)
+        last = next(reversed(prompts), None)
+        appended = {pid for pid, _ in iter_raw_records(mf, manifest.offset, scanned.offset)}
+        if appended & (prompts.keys() - {last}):
+            reason = "appended records reopen earlier prompts"
+        elif part_spool.resume(parts_path) != sum(agg.count for key, agg in aggregates.rows.items()
+                                                   if key[0] == model and key[2:] != OUTPUT_ROW):
+            part_spool.clear()
+            reason = "part table does not match the aggregates"
+        else:
+            spool.resume(out_path, aggregates.outputs(model))
+            return manifest, scanned, aggregates
+    if reason:
+        print(f"[full run] {mf}: {reason}")
+    manifest = Manifest(metrics, bins)
+    return manifest, manifest.scan(mf), AggregateTable(bins)
+
+
+def prompt_ranks(jsonl_path: pathlib.Path) -> dict:
+    """{pid: rank} in order of first appearance, the order a full run scores prompts in."""
+    rank = {}
+    for pid, _ in iter_raw_records(jsonl_path):
+        rank.setdefault(pid, len(rank))
+    return rank
+
+
+def parse_shard(text: str):
+    """'i/N' -> (i, N), for --shard."""
+    try:
+        i, n = (int(x) for x in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected i/N, got {text!r}")
+    if not 1 <= i <= n:
+        raise argparse.ArgumentTypeError(f"shard {i} is not in 1..{n}")
+    return i, n
+
+
+def evaluate_and_save(mf: pathlib.Path, cache: CountCache = None, sweep: bool = False, metrics=DEFAULT_METRICS,
+                      pack: bool = False, workers: int = 1, plans: dict = None, incremental: bool = False,
+                      shard: tuple = None, bins: int = 0):
+    """Evaluate one model file and write its eval JSON, part table,
+    aggregates and sweep.
+
+    With incremental, only records appended since the last incremental run
+    are scored, and the file's manifest is updated. With shard = (i, N),
+    only every N-th prompt from the i-th on is scored, and the results go
+    to eval/shards/ for merge_shards().
+
+    Returns the eval dict without its per-output records.
+    """
+    model = plain_path(mf).stem
+    outdir, prefix, pids = OUTDIR, model, None
+    meta = {"model": model, "metrics": list(metrics), "counter_version": COUNTER_VERSION}
+    if shard:
+        i, n = shard
+        # prompts are dealt out by first appearance, so every shard gets its share
+        rank = prompt_ranks(mf)
+        pids = {pid for pid, r in rank.items() if r % n == i - 1}
+        outdir, prefix = SHARD_DIR, f"{model}_shard{i}of{n}"
+        outdir.mkdir(parents=True, exist_ok=True)
+        meta.update(shard=[i, n], prompt_rank={str(pid): r for pid, r in rank.items() if pid in pids})
+    if pack and not pack_is_fresh(pack_path(mf), mf):
+        write_pack(pack_path(mf), iter_prompt_groups(mf), mf)
+    # records and part rows stream to disk while scoring; only aggregates stay in memory
+    spool, part_spool = RecordSpool(), PartTableSpool()
+    try:
+        if incremental:
+            manifest, scanned, aggregates = resume_incremental(mf, metrics, spool, part_spool, bins)
+            aggregates.meta.update(meta)
+            res = evaluate_model_file(mf, cache, sweep, metrics, spool, workers, plans,
+                                      aggregates, manifest.offset, scanned.offset, part_spool)
+        else:
+            res = evaluate_model_file(mf, cache, sweep, metrics, spool, workers, plans,
+                                      AggregateTable(bins, meta), part_spool=part_spool, pids=pids)
+        sweep_res = res.pop("tolerance_sweep", None)
+        aggregates = res.pop("aggregates")
+        spool.write_eval(res, outdir / f"{prefix}_eval.json")
+        part_spool.save(outdir / f"{prefix}_parts.npy")
+    finally:
+        spool.close()
+        part_spool.close()
+    aggregates.save(outdir / f"{prefix}_aggregates.json")
+    if sweep_res:
+        sweep_path = outdir / f"{prefix}_tolerance_sweep.json"
+        sweep_path.write_text(json.dumps(sweep_res, ensure_ascii=False, indent=2), encoding="utf-8")
+    if incremental:
+        # saved last, so a run cut short is redone in full instead of trusted
+        scanned.record_results([outdir / f"{prefix}_eval.json", outdir / f"{prefix}_parts.npy",
+                                outdir / f"{prefix}_aggregates.json"])
+        scanned.save(OUTDIR / f"{model}_manifest.json")
+    return res
+
+
+def merge_shards(model: str, sweep: bool = False):
+    """Combine the --shard results of one model into its eval JSON, part
+    table, aggregates and sweep, as one unsharded run would have written
+    them. Returns the eval dict, or None when its shards are missing or
+    don't fit together."""
+    shards = [AggregateTable.load(path) for path in SHARD_DIR.glob(f"{model}_shard*of*_aggregates.json")]
+    if not shards:
+        print(f"[skip] no shards of {model} in {SHARD_DIR}")
+        return None
+    shards.sort(key=lambda t: t.meta["shard"])
+    splits = sorted({t.meta["shard"][1] for t in shards})
+    if len(splits) > 1:
+        print(f"[skip] {model}: {SHARD_DIR} mixes {splits}-way splits, keep only one")
+        return None
+    n = splits[0]
+    missing = sorted(set(range(1, n + 1)) - {t.meta["shard"][0] for t in shards})
+    if missing:
+        print(f"[skip] {model}: shards {missing} of {n} are missing")
+        return None
+    settings = {(tuple(t.meta["metrics"]), t.meta["counter_version"], t.bins) for t in shards}
+    if len(settings) > 1:
+        print(f"[skip] {model}: shards were scored with different metrics, counters or histogram bins")
+        return None
+
+    rank = {int(pid): r for t in shards for pid, r in t.meta["prompt_rank"].items()}
+    meta = {k: shards[0].meta[k] for k in ("model", "metrics", "counter_version")}
+    merged = AggregateTable(shards[0].bins, meta)
+    for t in shards:
+        merged.merge(t)
+    merged.reorder(rank)
+    res = summarize_model(model, merged.prompts(model))
+
+    prefixes = [SHARD_DIR / f"{model}_shard{i}of{n}" for i in range(1, n + 1)]
+    table = np.concatenate([np.load(f"{prefix}_parts.npy", allow_pickle=False) for prefix in prefixes])
+    order = np.argsort(np.array([rank[pid] for pid in table["prompt_id"].tolist()], dtype=np.int64), kind="stable")
+    table = table[order]
+    # each shard lists its prompts in rank order, so a streaming merge restores file order
+    spool = RecordSpool()
+    try:
+        streams = [((rank[pid], text) for pid, text in iter_record_texts(pathlib.Path(f"{prefix}_eval.json")))
+                   for prefix in prefixes]
+        for _, text in heapq.merge(*streams, key=lambda t: t[0]):
+            spool.append_text(text)
+        spool.write_eval(res, OUTDIR / f"{model}_eval.json")
+    finally:
+        spool.close()
+    save_part_table(OUTDIR / f"{model}_parts.npy", table)
+    merged.save(OUTDIR / f"{model}_aggregates.json")
+    if sweep:
+        sweep_path = OUTDIR / f"{model}_tolerance_sweep.json"
+        sweep_path.write_text(json.dumps(tolerance_sweep(table), ensure_ascii=False, indent=2), encoding="utf-8")
+    return res
+
+
+def evaluate_in_process(mf: pathlib.Path, cache_path: pathlib.Path = None, *args):
+    """evaluate_and_save() for --concurrent, with the process's own cache
+    connection; main() owns the cache."""
+    cache = CountCache(cache_path, owner=False) if cache_path else None
+    try:
+        return evaluate_and_save(mf, cache, *args)
+    finally:
+        if cache:
+            cache.close()
+
+
+class FollowTail:
+    """Score the records appended to one model file as they arrive (--follow).
+
+    Each poll reads only the bytes added since the last one; every complete
+    line is scored on its own, and the rolling pass rates per prompt and per
+    level go to the screen and to eval/<model>_status.json.
+    """
+
+    def __init__(self, path: pathlib.Path, metrics=DEFAULT_METRICS, plans: dict = None):
+        self.path = path
+        self.metrics = metrics
+        self.plans = dict(plans or {})
+        self.model = plain_path(path).stem
+        self.status_path = OUTDIR / f"{self.model}_status.json"
+        self.reset()
+
+    def reset(self):
+        self.pos = 0
+        self.buf = b""
+        self.table_pos = 0
+        self.table_buf = b""
+        self.decoder = RecordDecoder()
+        self.read_prompts()
+        self.prompts = {}     # pid -> Aggregate over its outputs
+        self.levels = {}      # level -> Aggregate over its parts
+        self.outputs = self.passed = 0
+        self.recent = deque(maxlen=FOLLOW_WINDOW)
+
+    def poll(self) -> int:
+        """Score every complete line added since the last poll; returns how many."""
+        if not self.path.exists():
+            return 0
+        size = self.path.stat().st_size
+        if size < self.pos:
+            print(f"[follow] {self.path} shrank, scoring it again from the start")
+            self.reset()
+        if size == self.pos:
+            return 0
+        with self.path.open("rb") as f:
+            f.seek(self.pos)
+            data = f.read(size - self.pos)
+        self.pos += len(data)
+        # a line still being written stays in buf until its newline arrives
+        lines = (self.buf + data).split(b"\n")
+        self.buf = lines.pop()
+        scored = 0
+        for line in lines:
+            if line.strip():
+                self.score(line)
+                scored += 1
+        if scored:
+            self.write_status()
+        return scored
+
+    def read_prompts(self):
+        """Add the rows appended to the file's prompts table since the last call."""
+        path = prompts_table_path(self.path)
+        if not path.exists():
+            return
+        if path.stat().st_size < self.table_pos:
+            # rewritten: its rows replace the ones read so far
+            self.table_pos, self.table_buf = 0, b""
+        with path.open("rb") as f:
+            f.seek(self.table_pos)
+            data = f.read()
+        self.table_pos += len(data)
+        lines = (self.table_buf + data).split(b"\n")
+        self.table_buf = lines.pop()
+        for line in lines:
+            if line.strip():
+                row = json.loads(line)
+                self.decoder.prompts[int(row["prompt_id"])] = row
+
+    def score(self, line: bytes):
+        pid = record_prompt_id(line)
+        if pid not in self.decoder.prompts:
+            # normalized outputs get a prompt's table row before its records
+            self.read_prompts()
+        rec = self.decoder.decode(pid, line)
+        plan = plan_for(pid, rec.verification, self.plans)
+        self.plans[pid] = (rec.verification, plan)
+        res = verify_output(rec.output, rec.verification, plan=plan, metrics=self.metrics)
+
+        passed = int(res["output_pass"])
+        prompt = self.prompts.setdefault(pid, Aggregate())
+        prompt.add(passed, res["sample_scores"])
+        for part in res["part_results"].values():
+            level = self.levels.setdefault(part["level"], Aggregate())
+            level.add(part["scores"]["hard"] == 1.0, {"hard": part["scores"]["hard"]})
+        self.outputs += 1
+        self.passed += passed
+        self.recent.append(passed)
+
+        levels = " ".join(f"{level} {agg.pass_rate():.2f}" for level, agg in self.levels.items())
+        print(f"{self.model} prompt {pid} sample {rec.sample_id}: {'pass' if passed else 'FAIL'}"
+              f" | prompt {prompt.passed}/{prompt.count} | model {self.passed}/{self.outputs}"
+              f" | last {len(self.recent)} {sum(self.recent) / len(self.recent):.2f} | {levels}")
+
+    def status(self) -> dict:
+        return {
+            "model": self.model,
+            "bytes_read": self.pos,
+            "outputs": self.outputs,
+            "pass_rate": self.passed / self.outputs if self.outputs else 0.0,
+            "recent_pass_rate": sum(self.recent) / len(self.recent) if self.recent else 0.0,
+            "level_pass_rate": {level: agg.pass_rate() for level, agg in self.levels.items()},
+            "prompt_pass_rate": {pid: prompt.pass_rate() for pid, prompt in self.prompts.items()},
+            "prompt_outputs": {pid: prompt.count for pid, prompt in self.prompts.items()},
+            "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        }
+
+    def write_status(self):
+        # replaced in one step, so a reader never sees a half-written file
+        tmp = self.status_path.with_name(self.status_path.name + ".tmp")
+        tmp.write_text(json.dumps(self.status(), ensure_ascii=False, indent=2), encoding="utf-8")
+        os.replace(tmp, self.status_path)
+
+
+def follow_model_files(paths, metrics=DEFAULT_METRICS, plans: dict = None, idle_timeout: float = None,
+                       poll: float = FOLLOW_POLL):
+    """Tail every file in paths until Ctrl-C, or until none grew for idle_timeout seconds."""
+    tails = [FollowTail(path, metrics, plans) for path in paths]
+    idle_since = time.monotonic()
+    try:
+        while True:
+            if sum(tail.poll() for tail in tails):
+                idle_since = time.monotonic()
+            elif idle_timeout is not None and time.monotonic() - idle_since >= idle_timeout:
+                break
+            else:
+                time.sleep(poll)
+    except KeyboardInterrupt:
+        pass
+    return tails
+
+
 
 
 # ---------------------------------------------------------------------
 # Main
 # ---------------------------------------------------------------------
 def main():
-    results = []
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", nargs="?", choices=["merge"],
+                        help="merge: combine the --shard results in eval/shards/ into eval/")
+    parser.add_argument("--cache", type=pathlib.Path, help="SQLite file that keeps part counts between runs")
+    parser.add_argument("--sweep", action="store_true", help="also write pass rates over a grid of tolerances")
+    parser.add_argument("--metrics", nargs="+", choices=sorted(METRICS), default=list(DEFAULT_METRICS),
+                        help="metrics to score each part with; hard is always included")
+    parser.add_argument("--pack", action="store_true",
+                        help="pack each model file (text blob + offset index) if not packed yet, then read from it")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="processes that score prompt chunks in parallel (1 = serial)")
+    parser.add_argument("--concurrent", action="store_true",
+                        help="evaluate all model files at once, one process per model")
+    parser.add_argument("--incremental", action="store_true",
+                        help="only score records appended since the last --incremental run (kept in eval/*_manifest.json)")
+    parser.add_argument("--follow", action="store_true",
+                        help="tail the model files while generation.py writes them, scoring each new sample")
+    parser.add_argument("--idle-timeout", type=float,
+                        help="with --follow, stop once no file has grown for this many seconds")
+    parser.add_argument("--shard", type=parse_shard, metavar="i/N",
+                        help="score only shard i of N of every model's prompts, into eval/shards/")
+    parser.add_argument("--histogram", type=int, default=0, metavar="BINS",
+                        help="also keep a histogram of each metric's scores in the aggregates")
+    args = parser.parse_args()
+    if args.shard and args.incremental:
+        parser.error("--shard and --incremental can't be combined")
+    # pass/fail is decided by the hard metric
+    metrics = list(dict.fromkeys(["hard", *args.metrics]))
+    # every model answers the same prompts: compile their specs once for all
+    plans = load_plan_table()
+
+    if args.follow:
+        follow = []
+        for mf in MODEL_FILES:
+            if is_compressed(find_variant(mf)):
+                print(f"[skip] {find_variant(mf)}: a compressed file can't be read while it is still being written")
+                continue
+            follow.append(mf)
+        for tail in follow_model_files(follow, metrics, plans, args.idle_timeout):
+            if tail.outputs:
+                levels = ", ".join(f"{level} {agg.pass_rate():.3f}" for level, agg in tail.levels.items())
+                print(f"{tail.model}: {tail.passed}/{tail.outputs} outputs pass; part pass rate by level: {levels}")
+        return
+
+    if args.command == "merge":
+        results = [res for mf in MODEL_FILES if (res := merge_shards(plain_path(mf).stem, args.sweep))]
+        for r in results:
+            for metric_name, acc in r["model_accuracy"].items():
+                print(f"{r['model']} ({metric_name}) overall accuracy: {acc:.3f}")
+        return
+
+    model_files = []
     for mf in MODEL_FILES:
+        # a compressed copy (x_output.jsonl.gz, ...) stands in for a missing file
+        mf = find_variant(mf)
         if not mf.exists():
             print(f"[skip] {mf} not found (cwd={os.getcwd()})")
             continue
-        print(mf.stem)
-        res = evaluate_model_file(mf)
-        results.append(res)
-        out_path = OUTDIR / f"{res['model']}_eval.json"
-        out_path.write_text(json.dumps(res, ensure_ascii=False, indent=2), encoding="utf-8")
+        model_files.append(mf)
+    options = (args.sweep, metrics, args.pack, args.workers, plans, args.incremental, args.shard, args.histogram)
+
+    results = []
+    # the version purge and the trimming happen once, here
+    cache = CountCache(args.cache) if args.cache else None
+    try:
+        if args.concurrent and len(model_files) > 1:
+            with ProcessPoolExecutor(max_workers=len(model_files)) as pool:
+                futures = []
+                for mf in model_files:
+                    print(plain_path(mf).stem)
+                    futures.append(pool.submit(evaluate_in_process, mf, args.cache, *options))
+                # results are collected in MODEL_FILES order, whichever finishes first
+                results = [f.result() for f in futures]
+        else:
+            for mf in model_files:
+                print(plain_path(mf).stem)
+                results.append(evaluate_and_save(mf, cache, *options))
+    finally:
+        if cache:
+            cache.close()
 
     if not results:
         print("No model files processed.")
@@ -40,6 +40,9 @@ from openai import OpenAI
 import os
 from collections import defaultdict
 from old_results.Numerical_Script.formatChecking_evaluation import slice_parts
+from helpers.parts import PartStreamCounter
+from helpers.records import prompts_table_path, write_prompt_row
+from helpers.storage import open_stream
 
 openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
 together_client = OpenAI(base_url="https://api.together.xyz/v1", api_key=os.getenv("TOGETHER_API_KEY"))
@@ -48,7 +51,9 @@ together_client = OpenAI(base_url="https://api.together.xyz/v1", api_key=os.gete
 ROOT = Path(__file__).resolve().parent
 DATA_DIR = ROOT / "data"
 PROMPTS_FILE = DATA_DIR / "segmented.jsonl"
-invalid_log_path = DATA_DIR / "invalid_generation_log.txt"
+# "" for plain files, or ".gz", ".xz", ".zst" to write outputs and the invalid log compressed
+COMPRESSION = ""
+invalid_log_path = DATA_DIR / f"invalid_generation_log.txt{COMPRESSION}"
 #constants
 number_of_samples = 8
 TEMPERATURE = 0.6
@@ -79,14 +84,15 @@ def load_prompts(path: Path):
     return out
 
 # call a specific llm, input the model you want to invoke, the input text, and the number of resp genearte at once
-def call_llm(model_info: dict, prompt_text: str, n: int = 1):
+# on_part(index, part, stats) is called as soon as output index moves on from a part
+def call_llm(model_info: dict, prompt_text: str, n: int = 1, on_part=None):
     client = model_info["client"]
     model_name = model_info["name"]
     #from client object, get attribute base_url: if together ai, sleep 2.5s
     if "together.xyz" in str(getattr(client, "base_url", "")):
         time.sleep(2.5)
-    #get response from model
-    resp = client.chat.completions.create(
+    #stream the response from model
+    stream = client.chat.completions.create(
         model=model_name,
         messages=[
             {"role": "system", "content": SYSTEM_PROMPT},
@@ -95,10 +101,26 @@ def call_llm(model_info: dict, prompt_text: str, n: int = 1):
         n=n,
         temperature=TEMPERATURE,
         top_p=TOP_P,
-        max_tokens=MAX_TOKENS
+        max_tokens=MAX_TOKENS,
+        stream=True
     )
+    # count each part of every output while it is written
+    texts = [[] for _ in range(n)]
+    counters = [PartStreamCounter() for _ in range(n)]
+    for chunk in stream:
+        for c in chunk.choices:
+            delta = c.delta.content
+            if not delta:
+                continue
+            texts[c.index].append(delta)
+            counter = counters[c.index]
+            counter.feed(delta)
+            if on_part:
+                for part, stats in counter.finished:
+                    on_part(c.index, part, stats)
+            counter.finished.clear()
     # put the n ouput texts in a list
-    return [(c.message.content or "").strip() for c in resp.choices]
+    return ["".join(t).strip() for t in texts]
 
 # does the output text have expected parts
 def check_valid_output(output_text: str, expected_parts: int) -> bool:
@@ -119,19 +141,16 @@ def write_txt_line(f, prompt_id, prompt_type, sample_id, text):
     f.flush()
 
 # write to json, for data processing
+# prompt type and verification live once per prompt in the prompts table
 def write_jsonl_line(f, prompt_row, sample_id, text):
     '''
     prompt id
-    prompt type
     sample id
-    verification
     output
     '''
     record = {
         "prompt_id": prompt_row["prompt_id"],
-        "prompt_type": prompt_row["prompt_type"],
         "sample_id": sample_id,
-        "verification": prompt_row.get("verification", {}),
         "output": text
     }
     f.write(json.dumps(record, ensure_ascii=False) + "\n")
@@ -139,7 +158,7 @@ def write_jsonl_line(f, prompt_row, sample_id, text):
 
 #given a single prompt
 #pass in model info, prompt row, txt_file and jsonl_file to be update
-def generate_for_prompt(model_key, model_info, prompt_row, txt_file, jsonl_file):
+def generate_for_prompt(model_key, model_info, prompt_row, txt_file, jsonl_file, invalid_log):
     valid_samples = 0
     total_generated = 0
     sample_id = 1
@@ -150,7 +169,10 @@ def generate_for_prompt(model_key, model_info, prompt_row, txt_file, jsonl_file)
     while valid_samples < number_of_samples:
         #remaining amount to generate
         n_to_generate = number_of_samples - valid_samples
-        new_texts = call_llm(model_info, prompt_row["prompt"], n=n_to_generate)
+        def report_part(index, part, stats):
+            print(f"[{model_key}] pid {prompt_row['prompt_id']} output {index + 1}/{n_to_generate}: "
+                  f"part {part} done, {stats.words} words, {stats.lines} lines, {stats.bullets} bullets")
+        new_texts = call_llm(model_info, prompt_row["prompt"], n=n_to_generate, on_part=report_part)
         total_generated += len(new_texts)
         # write to log
         with open(log_path, "a", encoding="utf-8") as log_file:
@@ -169,33 +191,40 @@ def generate_for_prompt(model_key, model_info, prompt_row, txt_file, jsonl_file)
                 sample_id += 1
             # write to invalid log
             else: 
-                with open(invalid_log_path, "a", encoding="utf-8") as log_file:
-                    log_file.write(
-                        f"\n[{model_key}] pid {prompt_row['prompt_id']} sample={sample_id}\n"
-                        f"{text}\n{'-'*80}\n"
-                    )
+                invalid_log.write(
+                    f"\n[{model_key}] pid {prompt_row['prompt_id']} sample={sample_id}\n"
+                    f"{text}\n{'-'*80}\n"
+                )
         print(f"[{model_key}] pid {prompt_row['prompt_id']} progress: {valid_samples}/8 valid (total {total_generated})")
     print(f"[{model_key}] pid {prompt_row['prompt_id']} reached 8 valid after {total_generated} generations.")
 
 def main():
     prompts = load_prompts(PROMPTS_FILE)
-    # for every model
-    for mkey, minfo in models.items():
-        print(f"==> Generating outputs with {mkey} ...")
-        txt_path = DATA_DIR / f"{mkey}_output.txt"
-        jsonl_path = DATA_DIR / f"{mkey}_output.jsonl"
-        log_path = DATA_DIR / f"{mkey}_generation_log.txt"
-        # if txt, jsonl, or log file already exists, delete them before starting a new round
-        if txt_path.exists():
-            txt_path.unlink()
-        if jsonl_path.exists():
-            jsonl_path.unlink()
-        if log_path.exists():
-            log_path.unlink()
-        with txt_path.open("a", encoding="utf-8") as txt_file, jsonl_path.open("a", encoding="utf-8") as jsonl_file:
-            for prompt_row in prompts:
-                generate_for_prompt(mkey, minfo, prompt_row, txt_file, jsonl_file)
-        print(f"Done, saved to {txt_path} and {jsonl_path}\n")
+    # one handle for the whole run: with COMPRESSION set, each open in append
+    # mode starts a new compressed member
+    with open_stream(invalid_log_path, "a") as invalid_log:
+        # for every model
+        for mkey, minfo in models.items():
+            print(f"==> Generating outputs with {mkey} ...")
+            txt_path = DATA_DIR / f"{mkey}_output.txt{COMPRESSION}"
+            jsonl_path = DATA_DIR / f"{mkey}_output.jsonl{COMPRESSION}"
+            table_path = prompts_table_path(jsonl_path)
+            log_path = DATA_DIR / f"{mkey}_generation_log.txt"
+            # if txt, jsonl, or log file already exists, delete them before starting a new round
+            if txt_path.exists():
+                txt_path.unlink()
+            if jsonl_path.exists():
+                jsonl_path.unlink()
+            if table_path.exists():
+                table_path.unlink()
+            if log_path.exists():
+                log_path.unlink()
+            with open_stream(txt_path, "a") as txt_file, open_stream(jsonl_path, "a") as jsonl_file, \
+                    open_stream(table_path, "a") as table_file:
+                for prompt_row in prompts:
+                    write_prompt_row(table_file, prompt_row)
+                    generate_for_prompt(mkey, minfo, prompt_row, txt_file, jsonl_file, invalid_log)
+            print(f"Done, saved to {txt_path} and {jsonl_path}\n")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,229 @@
+# helpers/aggregates.py
+import json
+import pathlib
+from fractions import Fraction
+
+from helpers.cache import COUNTER_VERSION
+from helpers.eval_files import eval_model, stale_reason
+
+# an AggregateTable row is keyed by these; output-level rows (one per
+# prompt, counting whole outputs) have level, relation and part None
+KEY_FIELDS = ("model", "prompt_id", "level", "relation", "part")
+OUTPUT_ROW = (None, None, None)
+
+
+class Aggregate:
+    """Mergeable count / pass count / per-metric sum, plus an optional histogram.
+
+    Sums are exact fractions, so aggregates merged in any order, from any
+    number of runs or machines, give the same means, to the last bit, as
+    statistics.mean over every value at once. With bins > 0, hist keeps a
+    histogram of each metric's scores over [0, 1].
+    """
+
+    def __init__(self, count: int = 0, passed: int = 0, sums: dict = None, bins: int = 0, hist: dict = None):
+        self.count = count
+        self.passed = passed
+        self.sums = sums if sums is not None else {}
+        self.bins = bins
+        self.hist = hist if hist is not None else {}
+
+    def add(self, passed, scores: dict):
+        """Count one value: passed is truthy for a pass, scores maps metric -> score."""
+        self.count += 1
+        self.passed += int(passed)
+        for metric, val in scores.items():
+            self.sums[metric] = self.sums.get(metric, 0) + Fraction(val)
+            if self.bins:
+                counts = self.hist.setdefault(metric, [0] * self.bins)
+                counts[min(max(int(val * self.bins), 0), self.bins - 1)] += 1
+
+    def merge(self, other: "Aggregate"):
+        if self.bins != other.bins:
+            raise ValueError(f"can't merge histograms of {self.bins} and {other.bins} bins")
+        self.count += other.count
+        self.passed += other.passed
+        for metric, total in other.sums.items():
+            self.sums[metric] = self.sums.get(metric, 0) + total
+        for metric, counts in other.hist.items():
+            mine = self.hist.setdefault(metric, [0] * self.bins)
+            self.hist[metric] = [a + b for a, b in zip(mine, counts)]
+        return self
+
+    def pass_rate(self) -> float:
+        return self.passed / self.count if self.count else 0.0
+
+    def means(self) -> dict:
+        return {m: float(total / self.count) if self.count else 0.0 for m, total in self.sums.items()}
+
+    def to_json(self) -> dict:
+        row = {
+            "count": self.count,
+            "passed": self.passed,
+            "sums": {m: [total.numerator, total.denominator] for m, total in self.sums.items()},
+        }
+        if self.bins:
+            row["hist"] = self.hist
+        return row
+
+    @classmethod
+    def from_json(cls, row: dict, bins: int = 0) -> "Aggregate":
+        sums = {m: Fraction(num, den) for m, (num, den) in row["sums"].items()}
+        return cls(row["count"], row["passed"], sums, bins, row.get("hist"))
+
+
+class AggregateTable:
+    """Aggregates keyed by (model, prompt_id, level, relation, part).
+
+    Each prompt has one output-level row (level, relation and part None)
+    over its outputs, and one row per part over the same outputs' parts.
+    Rows keep the order prompts were first scored in.
+    """
+
+    def __init__(self, bins: int = 0, meta: dict = None):
+        self.bins = bins
+        self.rows = {}
+        self.meta = meta if meta is not None else {}
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def row(self, key: tuple) -> Aggregate:
+        agg = self.rows.get(key)
+        if agg is None:
+            agg = self.rows[key] = Aggregate(bins=self.bins)
+        return agg
+
+    def merge_row(self, key: tuple, agg: Aggregate):
+        self.row(key).merge(agg)
+
+    def merge(self, other: "AggregateTable"):
+        for key, agg in other.rows.items():
+            self.merge_row(key, agg)
+        return self
+
+    def prompts(self, model: str) -> dict:
+        """{pid: output-level Aggregate} of one model, in row order."""
+        return {key[1]: agg for key, agg in self.rows.items() if key[0] == model and key[2:] == OUTPUT_ROW}
+
+    def outputs(self, model: str = None) -> int:
+        return sum(agg.count for key, agg in self.rows.items()
+                   if key[2:] == OUTPUT_ROW and (model is None or key[0] == model))
+
+    def rollup(self, fields) -> dict:
+        """Part rows merged over every key field not in fields: {key: Aggregate}."""
+        idx = [KEY_FIELDS.index(f) for f in fields]
+        out = {}
+        for key, agg in self.rows.items():
+            if key[2:] == OUTPUT_ROW:
+                continue
+            sub = tuple(key[i] for i in idx)
+            if sub not in out:
+                out[sub] = Aggregate(bins=self.bins)
+            out[sub].merge(agg)
+        return out
+
+    def reorder(self, rank: dict):
+        """Sort rows by rank[prompt_id], keeping their order within a prompt."""
+        order = sorted(self.rows, key=lambda key: rank[key[1]])
+        self.rows = {key: self.rows[key] for key in order}
+
+    def save(self, path: pathlib.Path):
+        rows = [dict(zip(KEY_FIELDS, key), **agg.to_json()) for key, agg in self.rows.items()]
+        meta = dict(self.meta, bins=self.bins, rows=rows)
+        pathlib.Path(path).write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> "AggregateTable":
+        meta = json.loads(pathlib.Path(path).read_text(encoding="utf-8"))
+        rows = meta.pop("rows")
+        table = cls(meta.pop("bins"), meta)
+        for row in rows:
+            key = tuple(row[f] for f in KEY_FIELDS)
+            table.rows[key] = Aggregate.from_json(row, table.bins)
+        return table
+
+
+def fresh_aggregates(eval_path) -> AggregateTable:
+    """The aggregates evaluation.py wrote with eval_path, merged into one table.
+
+    That is its _aggregates.json, else a complete set of --shard files in
+    eval/shards. None when there are none, or when they no longer describe
+    the eval JSON (another model, other counters, or older than it), in
+    which case the eval JSON has to be read.
+    """
+    eval_path = pathlib.Path(eval_path)
+    stem = eval_path.name.replace("_eval.json", "")
+    merged = eval_path.with_name(f"{stem}_aggregates.json")
+    if merged.exists():
+        paths = [merged]
+    else:
+        paths = sorted((eval_path.parent / "shards").glob(f"{stem}_shard*of*_aggregates.json"))
+    tables = [AggregateTable.load(path) for path in paths]
+    if not merged.exists():
+        shards = {tuple(t.meta["shard"]) for t in tables}
+        n = max((m for _, m in shards), default=0)
+        if shards != {(i, n) for i in range(1, n + 1)}:
+            return None
+    model = eval_model(eval_path) if eval_path.exists() else stem
+    for path, table in zip(paths, tables):
+        if table.meta.get("model") != model:
+            reason = f"written for {table.meta.get('model')}, not {model}"
+        elif table.meta.get("counter_version") != COUNTER_VERSION:
+            reason = "counted by other counters than the current ones"
+        else:
+            reason = stale_reason(path, eval_path)
+        if reason:
+            print(f"[stale] {path}: {reason}, reading {eval_path.name} instead")
+            return None
+    if not tables or len({t.bins for t in tables}) > 1:
+        return None
+    table = AggregateTable(tables[0].bins, dict(tables[0].meta))
+    for t in tables:
+        table.merge(t)
+    return table
+
+
+def hard_score_stats(eval_path, column: str, names) -> dict:
+    """Hard-score average, pass count and total per prompt and overall, with
+    each prompt's parts grouped by column ("level" or "relation").
+
+    Only the given names of column are kept, in that order. Read from
+    fresh_aggregates() when there are some, else from the eval JSON's
+    per-output records; None when there is neither.
+    """
+    eval_path = pathlib.Path(eval_path)
+    aggregates = fresh_aggregates(eval_path)
+    per_prompt, overall = {}, {name: [0, 0, 0] for name in names}   # hard sum, parts, passed
+
+    def add(pid, name, hard, count, passed):
+        if name not in overall:
+            return
+        if pid not in per_prompt:
+            per_prompt[pid] = {name: [0, 0, 0] for name in names}
+        for totals in (per_prompt[pid][name], overall[name]):
+            totals[0] += hard
+            totals[1] += count
+            totals[2] += passed
+
+    if aggregates:
+        for (pid, name), agg in aggregates.rollup(("prompt_id", column)).items():
+            add(pid, name, agg.sums["hard"], agg.count, agg.passed)
+    elif eval_path.exists():
+        with open(eval_path, encoding="utf-8") as f:
+            records = json.load(f)["per_output_records"]
+        for rec in records:
+            for part in rec["part_results"].values():
+                hard = part["scores"]["hard"]
+                add(rec["prompt_id"], part[column], hard, 1, int(hard == 1.0))
+    else:
+        return None
+
+    def summary(totals):
+        hard, count, passed = totals
+        return {"avg": float(hard) / count if count else 0.0, "pass": passed, "total": count}
+
+    return {
+        "per_prompt": {pid: {name: summary(t) for name, t in per_prompt[pid].items()} for pid in sorted(per_prompt)},
+        "global": {name: summary(t) for name, t in overall.items()},
+    }
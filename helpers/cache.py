@@ -0,0 +1,125 @@
+# helpers/cache.py
+import hashlib
+import pathlib
+import sqlite3
+import time
+
+# a count depends on the counters, on which counter each level goes to
+# (both in counting.py) and on how parts are sliced and trimmed (parts.py);
+# any edit to these files changes the version and drops old counts
+COUNTER_SOURCES = ("counting.py", "parts.py")
+MAX_ENTRIES = 1_000_000
+BUSY_TIMEOUT = 60.0  # seconds
+
+
+def source_version(paths) -> str:
+    h = hashlib.sha1()
+    for path in paths:
+        h.update(pathlib.Path(path).read_bytes())
+    return h.hexdigest()[:16]
+
+
+COUNTER_VERSION = source_version(pathlib.Path(__file__).with_name(name) for name in COUNTER_SOURCES)
+
+
+def text_digest(text) -> bytes:
+    # a PartView is hashed as the text it points at
+    text = getattr(text, "text", text)
+    return hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+class CountCache:
+    """On-disk (text hash, level, counter version) -> count store.
+
+    Backed by SQLite. Every hit refreshes the entry's last-used time, and
+    close() trims the table back to max_entries, least recently used first.
+
+    Only the owner, the process a run opens the cache in, drops old
+    versions and trims the table; --workers and --concurrent processes open
+    it with owner=False and just read and add counts. The database is in WAL
+    mode so they read while one of them writes.
+    """
+
+    def __init__(self, path, max_entries: int = MAX_ENTRIES, version: str = COUNTER_VERSION,
+                 owner: bool = True):
+        self.path = path
+        self.max_entries = max_entries
+        self.version = version
+        self.owner = owner
+        # writers queue for the lock instead of failing after sqlite's default 5 s
+        self.conn = sqlite3.connect(str(path), timeout=BUSY_TIMEOUT)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS counts ("
+            " digest BLOB, level TEXT, version TEXT, count INTEGER, used REAL,"
+            " PRIMARY KEY (digest, level, version)) WITHOUT ROWID"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS counts_used ON counts (used)")
+        if owner:
+            # counts made by an older counting.py can never be hit again
+            self.conn.execute("DELETE FROM counts WHERE version != ?", (version,))
+        # don't hold the write lock: --workers processes open the same file
+        self.conn.commit()
+
+    def lookup(self, keys):
+        """Return {(digest, level): count} for the keys already cached."""
+        found = {}
+        for digest, level in set(keys):
+            row = self.conn.execute(
+                "SELECT count FROM counts WHERE digest = ? AND level = ? AND version = ?",
+                (digest, level, self.version),
+            ).fetchone()
+            if row is not None:
+                found[(digest, level)] = row[0]
+        return found
+
+    def touch(self, keys):
+        """Refresh the last-used time of cached keys."""
+        now = time.time()
+        self.conn.executemany(
+            "UPDATE counts SET used = ? WHERE digest = ? AND level = ? AND version = ?",
+            [(now, digest, level, self.version) for digest, level in keys],
+        )
+
+    def store(self, items):
+        """Save ((digest, level), count) pairs."""
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO counts VALUES (?, ?, ?, ?, ?)",
+            [(digest, level, self.version, count, now) for (digest, level), count in items],
+        )
+
+    def measure(self, jobs, measure_many):
+        """Counts for (level, text) jobs; only misses go to measure_many(jobs)."""
+        keys = [(text_digest(text), level) for level, text in jobs]
+        found = self.lookup(keys)
+        missing = [i for i, key in enumerate(keys) if key not in found]
+        items = []
+        if missing:
+            fresh = measure_many([jobs[i] for i in missing])
+            items = [(keys[i], count) for i, count in zip(missing, fresh)]
+        # nothing is written before the misses are counted, so the write lock
+        # is not held while counting
+        self.touch(list(found))
+        self.store(items)
+        found.update(items)
+        return [found[key] for key in keys]
+
+    def count(self, level: str, text: str, counter) -> int:
+        """Cached counter(level, text) for a single part."""
+        return self.measure([(level, text)], lambda jobs: [counter(*job) for job in jobs])[0]
+
+    def evict(self):
+        total = self.conn.execute("SELECT COUNT(*) FROM counts").fetchone()[0]
+        if total > self.max_entries:
+            self.conn.execute(
+                "DELETE FROM counts WHERE (digest, level, version) IN ("
+                " SELECT digest, level, version FROM counts ORDER BY used LIMIT ?)",
+                (total - self.max_entries,),
+            )
+
+    def close(self):
+        if self.owner:
+            self.evict()
+        self.conn.commit()
+        self.conn.close()
@@ -1,11 +1,58 @@
 # helpers/counting.py
 import re
+from typing import NamedTuple
+
+import numpy as np
 
 WORD_RE   = re.compile(r"\b\w+\b", re.UNICODE)
 BULLET_RE = re.compile(r"^\s*([\-*\u2022])\s+.+", re.MULTILINE)
+BULLET_CHARS = "-*\u2022"
+# every character str.splitlines() splits on
+LINE_BREAKS = "\n\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029"
+# line breaks other than "\n"
+EXTRA_BREAK_RE = re.compile("[%s]" % LINE_BREAKS[1:])
+
+# \w in a str pattern is str.isalnum() or "_"; words are maximal runs of it,
+# so marking word chars "w" and the rest " " lets bytes.count find the starts.
+# UTF-8 encodes a character as bytes >= 0x80 only, so one table covers texts
+# whose non-ASCII characters are all word chars and one those with none.
+ASCII_WORD_TABLE = bytes(
+    ord("w") if b < 128 and (chr(b).isalnum() or b == ord("_")) else ord(" ")
+    for b in range(256)
+)
+UTF8_WORD_TABLE = ASCII_WORD_TABLE[:128] + b"w" * 128
+
+class WordClassTable(dict):
+    """str.translate table that classifies each code point on first sight."""
+
+    def __missing__(self, cp: int) -> str:
+        ch = chr(cp)
+        mark = "w" if ch.isalnum() or ch == "_" else " "
+        self[cp] = mark
+        return mark
+
+WORD_CLASS = WordClassTable()
+
+def is_word_char(ch: str) -> bool:
+    return WORD_CLASS[ord(ch)] == "w"
+
+def count_word_starts(marks) -> int:
+    if isinstance(marks, bytes):
+        return marks.count(b" w") + (marks[:1] == b"w")
+    return marks.count(" w") + (marks[:1] == "w")
 
 def word_count(text: str) -> int:
-    return len(WORD_RE.findall(text or ""))
+    # same count as len(WORD_RE.findall(text)) without building the words
+    if not text:
+        return 0
+    if text.isascii():
+        return count_word_starts(text.encode("ascii").translate(ASCII_WORD_TABLE))
+    # classify each distinct non-ASCII character once, without slicing runs out
+    kinds = {WORD_CLASS[ord(ch)] for ch in set(text) if ch > "\x7f"}
+    if len(kinds) == 1:
+        table = UTF8_WORD_TABLE if "w" in kinds else ASCII_WORD_TABLE
+        return count_word_starts(text.encode("utf-8", "surrogatepass").translate(table))
+    return count_word_starts(text.translate(WORD_CLASS))
 
 def paragraph_count(text: str) -> int:
     if not text:
@@ -21,3 +68,360 @@ def line_count(text: str) -> int:
         return 0
     # Count non-empty lines
     return sum(1 for ln in text.splitlines() if ln.strip())
+
+
+class TextStats(NamedTuple):
+    words: int
+    lines: int       # non-empty lines, same as line_count
+    paragraphs: int  # blank-line separated blocks
+    bullets: int     # BULLET_RE items
+    chars: int
+
+    def count(self, level: str) -> int:
+        """Return the measurement for a verification level, 0 if unknown."""
+        if level == "word":
+            return self.words
+        if level == "paragraph":
+            # bullet items take precedence, as in paragraph_count
+            return self.bullets or self.paragraphs
+        if level == "line":
+            return self.lines
+        return 0
+
+
+class ParagraphSpans(NamedTuple):
+    count: int         # paragraph_count(text)
+    paragraphs: list   # (start, end) of blank-line separated blocks, trimmed
+    bullets: list      # (start, end) of BULLET_RE items, marker to end of item
+
+
+def scan_lines(text: str):
+    """Walk the "\n" lines of text once.
+
+    Returns the non-empty line count plus paragraph and bullet spans as
+    offsets into text; the core of text_stats and paragraph_spans.
+    """
+    plain_breaks = EXTRA_BREAK_RE.search(text) is None
+    lines = 0
+    paragraphs, bullets = [], []
+    last = -1           # index of the previous non-blank "\n" line
+    pending = -1        # offset of a bare bullet marker waiting for its item text
+    pos = 0
+    for i, seg in enumerate(text.split("\n")):
+        body = seg.lstrip()
+        if body:
+            if plain_breaks:
+                lines += 1
+            else:
+                lines += sum(1 for ln in seg.splitlines() if ln.strip())
+            start = pos + len(seg) - len(body)
+            end = pos + len(seg.rstrip())
+            # two or more "\n" since the last text start a new paragraph
+            if last < 0 or i - last >= 2:
+                paragraphs.append((start, end))
+            else:
+                paragraphs[-1] = (paragraphs[-1][0], end)
+            last = i
+            if pending >= 0:
+                # BULLET_RE's \s+ runs over the newline, .+ eats this line
+                bullets.append((pending, pos + len(seg)))
+                pending = -1
+            elif body[0] in BULLET_CHARS:
+                rest = body[1:]
+                if not rest.strip():
+                    pending = start
+                elif rest[0].isspace():
+                    bullets.append((start, pos + len(seg)))
+        pos += len(seg) + 1
+    # a trailing bare marker only matches if .+ finds a non-"\n" blank
+    if pending >= 0 and text[pending + 2:].strip("\n"):
+        bullets.append((pending, len(text.rstrip("\n"))))
+    return lines, paragraphs, bullets
+
+
+def paragraph_spans(text: str) -> ParagraphSpans:
+    """paragraph_count with the paragraphs and bullet items as (start, end)
+    offsets, so callers can look at each one without copying it out."""
+    if not text:
+        return ParagraphSpans(0, [], [])
+    _, paragraphs, bullets = scan_lines(text)
+    return ParagraphSpans(len(bullets) or len(paragraphs), paragraphs, bullets)
+
+
+def text_stats(text: str) -> TextStats:
+    """Scan text once, line by line, and collect every level's count.
+
+    Gives the same numbers as word_count, line_count and paragraph_count.
+    """
+    if not text:
+        return TextStats(0, 0, 0, 0, 0)
+    lines, paragraphs, bullets = scan_lines(text)
+    return TextStats(word_count(text), lines, len(paragraphs), len(bullets), len(text))
+
+
+class StreamCounter:
+    """Running text_stats() for text that arrives in chunks.
+
+    feed() costs O(len(delta)) and stats() is O(1); after any sequence of
+    chunks stats() equals text_stats() of everything fed so far, with
+    words, blank lines and bullet markers split across chunk boundaries.
+    """
+
+    def __init__(self):
+        self.words = self.lines = self.paragraphs = self.bullets = self.chars = 0
+        self.prev_word = False    # last char fed was a word char
+        self.line_no = 0          # index of the current "\n" line
+        self.last_filled = -1     # index of the last "\n" line with text
+        self.sub_filled = False   # the open splitlines() line has text
+        # current "\n" line: "blank" until its first non-space char, then
+        # "marker"/"spaced" after a bullet marker, "done" once decided
+        self.mode = "blank"
+        # a bullet marker still waiting for item text; BULLET_RE's \s+ can
+        # run into later lines, so track what follows it
+        self.bare = False
+        self.tail_len = 0
+        self.tail_non_nl = False
+
+    def feed(self, delta: str):
+        if not delta:
+            return
+        self.chars += len(delta)
+        words = word_count(delta)
+        if self.prev_word and is_word_char(delta[0]):
+            words -= 1
+        self.words += words
+        self.prev_word = is_word_char(delta[-1])
+        for i, piece in enumerate(delta.split("\n")):
+            if i:
+                self.end_line()
+            self.extend_line(piece)
+
+    def stats(self) -> TextStats:
+        # a marker left bare at the end only matches if .+ finds a blank
+        trailing = self.bare and self.tail_non_nl
+        return TextStats(self.words, self.lines, self.paragraphs, self.bullets + trailing, self.chars)
+
+    def end_line(self):
+        if self.bare:
+            self.tail_len += 1
+        self.line_no += 1
+        self.mode = "blank"
+        self.sub_filled = False
+
+    def extend_tail(self, n: int):
+        # whitespace other than "\n" after the marker's first follower
+        if n and self.tail_len + n > 1:
+            self.tail_non_nl = True
+        self.tail_len += n
+
+    def count_lines(self, piece: str):
+        subs = EXTRA_BREAK_RE.split(piece) if EXTRA_BREAK_RE.search(piece) else [piece]
+        for j, sub in enumerate(subs):
+            if j:
+                self.sub_filled = False
+            if sub and not self.sub_filled and not sub.isspace():
+                self.lines += 1
+                self.sub_filled = True
+
+    def open_line(self, first: str):
+        if self.last_filled < 0 or self.line_no - self.last_filled >= 2:
+            self.paragraphs += 1
+        self.last_filled = self.line_no
+        if self.bare:
+            # the pending marker's .+ eats this line
+            self.bullets += 1
+            self.bare = False
+            self.mode = "done"
+        elif first in BULLET_CHARS:
+            self.mode = "marker"
+            self.bare = True
+            self.tail_len = 0
+            self.tail_non_nl = False
+        else:
+            self.mode = "done"
+
+    def extend_line(self, piece: str):
+        # piece continues the current "\n" line and holds no "\n"
+        if not piece:
+            return
+        self.count_lines(piece)
+        if self.mode == "blank":
+            body = piece.lstrip()
+            if self.bare:
+                self.extend_tail(len(piece) - len(body))
+            if not body:
+                return
+            self.open_line(body[0])
+            piece = body[1:]
+        if self.mode in ("marker", "spaced") and piece:
+            if self.mode == "marker" and not piece[0].isspace():
+                self.mode = "done"
+                self.bare = False
+            elif piece.lstrip():
+                self.bullets += 1
+                self.mode = "done"
+                self.bare = False
+            else:
+                self.mode = "spaced"
+                self.extend_tail(len(piece))
+
+
+# ---------------------------------------------------------------------
+# Batched counting over one concatenated buffer
+# ---------------------------------------------------------------------
+# one bit per character class; filled means "not whitespace"
+WORD, FILLED, BREAK = 1, 2, 4
+
+def char_class(ch: str) -> int:
+    bits = WORD if is_word_char(ch) else 0
+    if not ch.isspace():
+        bits |= FILLED
+    if ch in LINE_BREAKS:
+        bits |= BREAK
+    return bits
+
+ASCII_CLASS_TABLE = bytes(char_class(chr(b)) if b < 128 else 0 for b in range(256))
+
+def text_offsets(texts):
+    """[start, end) character offsets of each text once joined with "\n"."""
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    starts = np.zeros(len(texts), dtype=np.int64)
+    np.cumsum(lengths[:-1] + 1, out=starts[1:])
+    return starts, starts + lengths
+
+def view_offsets(views):
+    """Distinct sources of the views, and each view's offsets into them joined."""
+    index, sources = {}, []
+    for v in views:
+        if id(v.source) not in index:
+            index[id(v.source)] = len(sources)
+            sources.append(v.source)
+    base = text_offsets(sources)[0][[index[id(v.source)] for v in views]]
+    starts = base + np.fromiter((v.start for v in views), dtype=np.int64, count=len(views))
+    ends = base + np.fromiter((v.end for v in views), dtype=np.int64, count=len(views))
+    return sources, starts, ends
+
+def utf8_classes(texts, starts, ends):
+    """Join texts with "\n" into one UTF-8 buffer and classify every byte.
+
+    Returns a uint8 array of class bits, one per byte, and the given
+    character offsets into the joined text as byte offsets. ASCII bytes go
+    through a lookup table; the bytes of a multi-byte character all carry
+    that character's class.
+    """
+    joined = "\n".join(texts)
+    raw = joined.encode("utf-8", "surrogatepass")
+    classes = np.frombuffer(raw.translate(ASCII_CLASS_TABLE), dtype=np.uint8)
+    if len(raw) == len(joined):
+        return classes, starts, ends
+
+    # decode just the multi-byte characters and classify each distinct one
+    buf = np.frombuffer(raw + b"\0\0\0", dtype=np.uint8)
+    leads = np.flatnonzero(buf[:len(raw)] >= 0xC0)
+    b0 = buf[leads].astype(np.uint32)
+    b1, b2, b3 = (buf[leads + k].astype(np.uint32) & 0x3F for k in (1, 2, 3))
+    width = np.where(b0 >= 0xF0, 4, np.where(b0 >= 0xE0, 3, 2))
+    cps = np.where(width == 2, ((b0 & 0x1F) << 6) | b1,
+          np.where(width == 3, ((b0 & 0x0F) << 12) | (b1 << 6) | b2,
+                   ((b0 & 0x07) << 18) | (b1 << 12) | (b2 << 6) | b3))
+    distinct, inverse = np.unique(cps, return_inverse=True)
+    table = np.array([char_class(chr(cp)) for cp in distinct.tolist()], dtype=np.uint8)
+    classes = classes.copy()
+    for k in range(4):
+        sel = width > k
+        classes[leads[sel] + k] = table[inverse[sel]]
+
+    # shift character offsets by the extra bytes of earlier multi-byte chars
+    extra = np.zeros(len(leads) + 1, dtype=np.int64)
+    np.cumsum(width - 1, out=extra[1:])
+    lead_chars = leads - extra[:-1]
+    starts = starts + extra[np.searchsorted(lead_chars, starts)]
+    ends = ends + extra[np.searchsorted(lead_chars, ends)]
+    return classes, starts, ends
+
+def span_totals_sorted(hits: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    # how many of the sorted positions fall in each [start, end)
+    return (np.searchsorted(hits, ends) - np.searchsorted(hits, starts)).astype(np.int64)
+
+def words_in_spans(classes, starts, ends):
+    word = (classes & WORD).view(bool)
+    # a word starts where a word char follows a non-word char; the "\n"
+    # joining the texts keeps runs from crossing text boundaries
+    first = word.copy()
+    first[1:] &= ~word[:-1]
+    counts = span_totals_sorted(np.flatnonzero(first), starts, ends)
+    # a span opening in the middle of a word still holds that word
+    inside = starts < ends
+    at = np.minimum(starts, len(word) - 1)
+    counts += inside & word[at] & ~first[at]
+    return counts
+
+def lines_in_spans(classes, starts, ends):
+    # every stretch between two line breaks is a line; a non-empty one is
+    # counted at its first non-space byte, so spans that skip leading
+    # whitespace (as part views do) still see it
+    filled = (classes & FILLED) != 0
+    runs = np.flatnonzero(filled & ~np.concatenate(([False], filled[:-1])))
+    bounds = np.concatenate(([-1], np.flatnonzero(classes & BREAK), [len(classes)]))
+    nxt = np.searchsorted(runs, bounds[:-1] + 1)
+    first = np.append(runs, len(classes))[nxt]
+    hits = first[first < bounds[1:]]
+    return span_totals_sorted(hits, starts, ends)
+
+def count_texts(texts, count_spans) -> np.ndarray:
+    texts = list(texts)
+    if not any(texts):
+        return np.zeros(len(texts), dtype=np.int64)
+    starts, ends = text_offsets(texts)
+    return count_spans(*utf8_classes(texts, starts, ends))
+
+def count_views(views, count_spans) -> np.ndarray:
+    views = list(views)
+    if not any(v.start < v.end for v in views):
+        return np.zeros(len(views), dtype=np.int64)
+    return count_spans(*utf8_classes(*view_offsets(views)))
+
+def word_count_batch(texts) -> np.ndarray:
+    """word_count for every text, as an int64 array."""
+    return count_texts(texts, words_in_spans)
+
+def line_count_batch(texts) -> np.ndarray:
+    """line_count for every text, as an int64 array."""
+    return count_texts(texts, lines_in_spans)
+
+def word_count_views(views) -> np.ndarray:
+    """word_count of every PartView's text, counted in place on its source."""
+    return count_views(views, words_in_spans)
+
+def line_count_views(views) -> np.ndarray:
+    """line_count of every PartView's text, counted in place on its source.
+
+    Views must start and end on non-space characters, as slice_part_views
+    makes them.
+    """
+    return count_views(views, lines_in_spans)
+
+
+# levels that can be counted for many part views in one vectorised call
+LEVEL_BATCH_COUNTERS = {
+    "word": word_count_views,
+    "line": line_count_views,
+}
+
+def measure(level: str, text: str) -> int:
+    # one scan gives every level, unknown levels measure 0
+    return text_stats(text).count(level)
+
+def measure_batch(jobs):
+    """Measure a list of (level, PartView) parts, one batched call per level."""
+    counts = [0] * len(jobs)
+    by_level = {}
+    for i, (level, _) in enumerate(jobs):
+        by_level.setdefault(level, []).append(i)
+    for level, idxs in by_level.items():
+        views = [jobs[i][1] for i in idxs]
+        batch = LEVEL_BATCH_COUNTERS.get(level)
+        vals = batch(views).tolist() if batch else [measure(level, v.text) for v in views]
+        for i, val in zip(idxs, vals):
+            counts[i] = val
+    return counts
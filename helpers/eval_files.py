@@ -0,0 +1,44 @@
+# helpers/eval_files.py
+import json
+import pathlib
+import re
+
+# nothing from the helpers package is imported here: sequential_level_analysis
+# has a helpers package of its own and loads this file by path
+
+# evaluation.py and the sequential evaluator both write "model" first
+MODEL_RE = re.compile(r'\{\s*"model":\s*("(?:[^"\\]|\\.)*")')
+
+
+def eval_model(eval_path) -> str:
+    """The model an eval JSON was written for, read from its first key; None if it has none."""
+    with open(eval_path, encoding="utf-8") as f:
+        m = MODEL_RE.match(f.read(4096))
+    return json.loads(m.group(1)) if m else None
+
+
+def stale_reason(path, eval_path):
+    """Why path, written next to eval_path, may no longer describe it; None if it still does.
+
+    evaluation.py writes the eval JSON first and its other files after it,
+    so a file older than the eval JSON was left by an earlier run, and the
+    JSON was rewritten since by something that didn't write the file.
+    """
+    path, eval_path = pathlib.Path(path), pathlib.Path(eval_path)
+    if eval_path.exists() and path.stat().st_mtime_ns < eval_path.stat().st_mtime_ns:
+        return f"older than {eval_path.name}"
+    return None
+
+
+def fresh_part_table(eval_path):
+    """The _parts.npy evaluation.py wrote with eval_path, or None when there
+    is none or it is stale, in which case the eval JSON has to be read."""
+    eval_path = pathlib.Path(eval_path)
+    path = eval_path.with_name(eval_path.name.replace("_eval.json", "_parts.npy"))
+    if not path.exists():
+        return None
+    reason = stale_reason(path, eval_path)
+    if reason:
+        print(f"[stale] {path}: {reason}, reading {eval_path.name} instead")
+        return None
+    return path
@@ -0,0 +1,119 @@
+# helpers/manifest.py
+import hashlib
+import json
+import os
+import pathlib
+
+from helpers.cache import COUNTER_VERSION
+from helpers.storage import open_stream, skip_to
+
+HASH_CHUNK = 1 << 20
+# how much of the scored part is hashed: the bytes just before offset
+TAIL_BYTES = 1 << 16
+
+
+def tail_digest(data: bytes) -> str:
+    return hashlib.blake2b(data[-TAIL_BYTES:], digest_size=16).hexdigest()
+
+
+def source_identity(path: pathlib.Path) -> dict:
+    # appending keeps the inode and only grows the file; a rewrite made
+    # next to it and renamed over it gets a new inode
+    st = os.stat(path)
+    return {"device": st.st_dev, "inode": st.st_ino, "size": st.st_size}
+
+
+def file_stamp(path: pathlib.Path) -> dict:
+    st = os.stat(path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+class Manifest:
+    """What earlier --incremental runs already scored in one model file.
+
+    offset is how many (decompressed) bytes of the file were read, digest
+    the hash of the last TAIL_BYTES of them and source the identity of the
+    file then. Checking those costs nothing like rereading the whole prefix,
+    but an edit further back in the same file, leaving it no shorter, goes
+    unnoticed: rescore without --incremental after editing a file by hand.
+    What they scored to is in the model's aggregates file
+    (helpers/aggregates.py), and results holds the stamps of the files that
+    run wrote, so files changed since are not extended.
+    """
+
+    def __init__(self, metrics, bins: int = 0, offset: int = 0, digest: str = None,
+                 counter_version: str = COUNTER_VERSION, source: dict = None, results: dict = None):
+        self.metrics = list(metrics)
+        self.bins = bins
+        self.offset = offset
+        self.digest = digest if digest is not None else tail_digest(b"")
+        self.counter_version = counter_version
+        self.source = source
+        self.results = results or {}
+
+    @classmethod
+    def load(cls, path: pathlib.Path):
+        """The manifest at path, or None if there is none."""
+        path = pathlib.Path(path)
+        if not path.exists():
+            return None
+        meta = json.loads(path.read_text(encoding="utf-8"))
+        return cls(meta["metrics"], meta.get("bins", 0), meta["offset"], meta["digest"], meta["counter_version"],
+                   meta.get("source"), meta.get("results"))
+
+    def save(self, path: pathlib.Path):
+        meta = {
+            "counter_version": self.counter_version,
+            "metrics": self.metrics,
+            "bins": self.bins,
+            "offset": self.offset,
+            "digest": self.digest,
+            "source": self.source,
+            "results": self.results,
+        }
+        pathlib.Path(path).write_text(json.dumps(meta, indent=2), encoding="utf-8")
+
+    def matches(self, metrics, bins: int = 0) -> bool:
+        """True when the earlier results were scored the way this run scores."""
+        return self.counter_version == COUNTER_VERSION and self.metrics == list(metrics) and self.bins == bins
+
+    def results_match(self, paths) -> bool:
+        """True when paths are still the files the earlier run wrote."""
+        return all(path.exists() and self.results.get(path.name) == file_stamp(path) for path in paths)
+
+    def record_results(self, paths):
+        self.results = {path.name: file_stamp(path) for path in paths}
+
+    def scan(self, source: pathlib.Path):
+        """Check that source was only appended to, and find its complete lines.
+
+        Returns the manifest of source up to its last newline, or None when
+        it is not the file scored before (another inode, or shorter) or the
+        bytes just before offset changed, i.e. the file was rewritten rather
+        than appended to. Only those bytes and the ones after offset are
+        read, though a compressed file is still decompressed up to offset.
+        A line still being written is left for the next run.
+        """
+        identity = source_identity(source)
+        if self.source is not None and (
+                (identity["device"], identity["inode"]) != (self.source["device"], self.source["inode"])
+                or identity["size"] < self.source["size"]):
+            return None
+        with open_stream(source, "rb") as f:
+            lo = max(self.offset - TAIL_BYTES, 0)
+            if lo:
+                skip_to(f, lo)
+            tail = f.read(self.offset - lo)
+            if len(tail) != self.offset - lo or tail_digest(tail) != self.digest:
+                return None
+            end, rest = self.offset, b""
+            while True:
+                chunk = f.read(HASH_CHUNK)
+                if not chunk:
+                    break
+                chunk = rest + chunk
+                cut = chunk.rfind(b"\n") + 1
+                tail = (tail + chunk[:cut])[-TAIL_BYTES:]
+                end += cut
+                rest = chunk[cut:]
+        return Manifest(self.metrics, self.bins, end, tail_digest(tail), self.counter_version, identity)
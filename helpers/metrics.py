@@ -1,4 +1,8 @@
 # helpers/metrics.py
+from typing import NamedTuple
+
+import numpy as np
+
 def parse_target(relation: str, target_str: str):
     r = relation.lower()
     if r == "range":
@@ -21,3 +25,161 @@ def hard_metric(relation: str, actual: int, target):
     else:
         return 0
 
+
+
+# relation strings as small integer codes, -1 for anything hard_metric rejects
+RELATION_CODES = {"range": 0, "gte": 1, "lte": 2, "approx": 3}
+RANGE, GTE, LTE, APPROX = 0, 1, 2, 3
+UNKNOWN_RELATION = -1
+
+def target_bounds(relation: str, target_str: str):
+    """Parsed target as (lo, hi); single targets give lo == hi."""
+    target = parse_target(relation, target_str)
+    return target if isinstance(target, tuple) else (target, target)
+
+class ConstraintPlan(NamedTuple):
+    """A prompt's verification dict, parsed once for all of its samples."""
+    parts: int
+    levels: list
+    relations: list
+    targets: list          # raw target strings, as reported
+    codes: np.ndarray      # RELATION_CODES per part
+    lo: np.ndarray         # target bounds per part
+    hi: np.ndarray
+
+    def scores(self, actual, metrics=("hard",)) -> dict:
+        """Every named metric for an (outputs, parts) array of counts."""
+        actual = np.asarray(actual, dtype=np.int64)
+        return {name: METRICS[name](self.codes, actual, self.lo, self.hi) for name in metrics}
+
+def relation_codes(relations) -> np.ndarray:
+    return np.array([RELATION_CODES.get(r, UNKNOWN_RELATION) for r in relations], dtype=np.int8)
+
+# verification levels as small ints, for columnar results
+LEVEL_CODES = {"word": 0, "paragraph": 1, "line": 2}
+UNKNOWN_LEVEL = -1
+
+def level_codes(levels) -> np.ndarray:
+    return np.array([LEVEL_CODES.get(lvl, UNKNOWN_LEVEL) for lvl in levels], dtype=np.int8)
+
+def hard_metric_array(relation_codes, actual, lo, hi) -> np.ndarray:
+    """hard_metric over arrays of measurements, as an int8 array of 0/1.
+
+    lo/hi are the parsed target bounds (equal for single targets) and all
+    four arguments broadcast against each other.
+    """
+    codes = np.asarray(relation_codes)
+    actual = np.asarray(actual)
+    lo = np.asarray(lo)
+    hi = np.asarray(hi)
+    approx = codes == APPROX
+    if approx.any():
+        # same float products and round-half-even as round(0.95 * target)
+        lo = np.where(approx, np.round(0.95 * lo), lo)
+        hi = np.where(approx, np.round(1.05 * hi), hi)
+    ok = (lo <= actual) & (actual <= hi)
+    ok = np.where(codes == GTE, actual >= lo, ok)
+    ok = np.where(codes == LTE, actual <= hi, ok)
+    ok &= codes != UNKNOWN_RELATION
+    return ok.astype(np.int8)
+
+def compile_plan(vtag: dict) -> ConstraintPlan:
+    n = int(vtag["part_number"])
+    specs = [vtag[str(k)] for k in range(1, n + 1)]
+    relations = [spec["relation"] for spec in specs]
+    targets = [spec["target"] for spec in specs]
+    bounds = [target_bounds(r, t) for r, t in zip(relations, targets)]
+    return ConstraintPlan(
+        parts=n,
+        levels=[spec["level"] for spec in specs],
+        relations=relations,
+        targets=targets,
+        codes=relation_codes(relations),
+        lo=np.array([b[0] for b in bounds], dtype=np.int64),
+        hi=np.array([b[1] for b in bounds], dtype=np.int64),
+    )
+
+
+# ---------------------------------------------------------------------
+# Tolerance sweeps
+# ---------------------------------------------------------------------
+def shortfall_ratio(num, den) -> np.ndarray:
+    # num / den with 0 / 0 read as 0 and x / 0 as inf
+    num = np.asarray(num, dtype=float)
+    den = np.asarray(den, dtype=float)
+    out = np.where(num > 0, np.inf, 0.0)
+    np.divide(num, den, out=out, where=den > 0)
+    return out
+
+def relative_deviation(relation_codes, actual, lo, hi) -> np.ndarray:
+    """How far each count misses its relation, relative to the target.
+
+    0 means the stated bound is met; approx parts give |actual - target| /
+    target, the rule the Numerical_Script evaluators apply at 15%. A part
+    passes at tolerance tol when its deviation is <= tol. Unknown relations
+    never pass.
+    """
+    codes = np.asarray(relation_codes)
+    actual = np.asarray(actual, dtype=float)
+    lo = np.asarray(lo, dtype=float)
+    hi = np.asarray(hi, dtype=float)
+    below = shortfall_ratio(np.maximum(lo - actual, 0.0), lo)
+    above = shortfall_ratio(np.maximum(actual - hi, 0.0), hi)
+    dev = np.where(codes == GTE, below,
+          np.where(codes == LTE, above,
+          np.where(codes == APPROX, shortfall_ratio(np.abs(actual - lo), lo),
+                   np.maximum(below, above))))
+    return np.where(codes == UNKNOWN_RELATION, np.inf, dev)
+
+def grouped_tolerance_curves(keys, deviations, tolerances) -> dict:
+    """Pass rate at every tolerance for each distinct key.
+
+    The deviations are sorted once (by key, then value) and every point of
+    a curve is a binary search into its key's slice.
+    """
+    keys = np.asarray(keys)
+    dev = np.asarray(deviations, dtype=float)
+    tolerances = np.asarray(tolerances, dtype=float)
+    if not len(keys):
+        return {}
+    order = np.lexsort((dev, keys))
+    keys, dev = keys[order], dev[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    ends = np.r_[starts[1:], len(keys)]
+    return {
+        key: np.searchsorted(dev[s:e], tolerances, side="right") / (e - s)
+        for key, s, e in zip(keys[starts].tolist(), starts.tolist(), ends.tolist())
+    }
+
+
+# ---------------------------------------------------------------------
+# Metric registry
+# ---------------------------------------------------------------------
+# name -> fn(relation_codes, actual, lo, hi) returning float scores in [0, 1];
+# metrics only see counts that were already measured, never the text
+METRICS = {}
+DEFAULT_METRICS = ("hard",)
+
+def register_metric(name: str):
+    def wrap(fn):
+        METRICS[name] = fn
+        return fn
+    return wrap
+
+@register_metric("hard")
+def hard_scores(relation_codes, actual, lo, hi) -> np.ndarray:
+    return hard_metric_array(relation_codes, actual, lo, hi).astype(float)
+
+@register_metric("soft_basic")
+def soft_basic_scores(relation_codes, actual, lo, hi) -> np.ndarray:
+    # full credit wherever hard passes, falling linearly to 0 at 100% deviation
+    codes = np.asarray(relation_codes)
+    dev = relative_deviation(codes, actual, lo, hi)
+    approx = codes == APPROX
+    if approx.any():
+        # approx passes anywhere in hard's +-5% band, so count from its edges
+        actual = np.asarray(actual, dtype=float)
+        lo = np.asarray(lo, dtype=float)
+        outside = np.maximum(np.maximum(np.round(0.95 * lo) - actual, actual - np.round(1.05 * lo)), 0.0)
+        dev = np.where(approx, shortfall_ratio(outside, lo), dev)
+    return np.clip(1.0 - dev, 0.0, 1.0)
@@ -0,0 +1,160 @@
+# helpers/pack.py
+import json
+import mmap
+import pathlib
+
+import numpy as np
+
+from helpers.parts import PartView, slice_part_views
+from helpers.records import OutputRecord, prompts_table_path
+from helpers.storage import find_variant, plain_path
+
+# a pack is a directory next to the *_output.jsonl it was made from:
+#   text.bin      every output, UTF-8, back to back
+#   samples.npy   one SAMPLE_DTYPE row per output, grouped by prompt
+#   parts.npy     one SPAN_DTYPE row per '#part n' section of each output
+#   prompts.json  prompt_type and verification per prompt_id, plus the
+#                 size/mtime of the source file and of its prompts table,
+#                 so stale packs are ignored
+SAMPLE_DTYPE = np.dtype([
+    ("prompt_id", np.int32),
+    ("sample_id", np.int32),
+    ("offset", np.int64),       # byte offset of the output in text.bin
+    ("length", np.int64),       # its length in bytes
+    ("first_part", np.int64),   # its first row in parts.npy
+    ("n_parts", np.int32),
+])
+SPAN_DTYPE = np.dtype([
+    ("part", np.int32),
+    ("start", np.int64),        # trimmed [start, end) in characters of the output
+    ("end", np.int64),
+    ("byte_start", np.int64),   # the same span in bytes from the output's offset
+    ("byte_end", np.int64),
+])
+ENCODING = ("utf-8", "surrogatepass")
+
+
+def source_stamp(path: pathlib.Path) -> dict:
+    st = path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def prompts_table_stamp(source: pathlib.Path):
+    # the specs of a normalized output file live in its prompts table
+    table = find_variant(prompts_table_path(plain_path(source)))
+    return source_stamp(table) if table.exists() else None
+
+
+def byte_offset(text: str, raw: bytes, i: int) -> int:
+    return i if len(raw) == len(text) else len(text[:i].encode(*ENCODING))
+
+
+def write_pack(pack_dir: pathlib.Path, groups, source: pathlib.Path):
+    """Pack (pid, [OutputRecord]) groups read from source into pack_dir.
+
+    groups should be lazy: source is stamped before they are read, so a
+    write to it while packing leaves the pack stale rather than wrongly fresh.
+    """
+    stamps = {"source": source_stamp(source), "prompts_table": prompts_table_stamp(source)}
+    pack_dir.mkdir(parents=True, exist_ok=True)
+    samples, spans, prompts = [], [], {}
+    offset = 0
+    with (pack_dir / "text.bin").open("wb") as blob:
+        for pid, records in groups:
+            prompts[pid] = {"prompt_type": records[0].prompt_type, "verification": records[0].verification}
+            for rec in records:
+                raw = rec.output.encode(*ENCODING)
+                blob.write(raw)
+                views = slice_part_views(rec.output)
+                samples.append((pid, rec.sample_id, offset, len(raw), len(spans), len(views)))
+                for v in views.values():
+                    spans.append((v.part, v.start, v.end,
+                                  byte_offset(rec.output, raw, v.start), byte_offset(rec.output, raw, v.end)))
+                offset += len(raw)
+    np.save(pack_dir / "samples.npy", np.array(samples, dtype=SAMPLE_DTYPE), allow_pickle=False)
+    np.save(pack_dir / "parts.npy", np.array(spans, dtype=SPAN_DTYPE), allow_pickle=False)
+    meta = dict(stamps, prompts={str(pid): p for pid, p in prompts.items()})
+    (pack_dir / "prompts.json").write_text(json.dumps(meta, ensure_ascii=False), encoding="utf-8")
+
+
+def pack_is_fresh(pack_dir: pathlib.Path, source: pathlib.Path) -> bool:
+    meta_path = pack_dir / "prompts.json"
+    if not meta_path.exists():
+        return False
+    meta = json.loads(meta_path.read_text(encoding="utf-8"))
+    return meta["source"] == source_stamp(source) and meta.get("prompts_table") == prompts_table_stamp(source)
+
+
+class PackedCorpus:
+    """Read-only, mmap-backed view of a pack.
+
+    Any output or part is one slice of text.bin away, and processes that
+    open the same pack share its pages through the OS cache.
+    """
+
+    def __init__(self, pack_dir: pathlib.Path):
+        meta = json.loads((pack_dir / "prompts.json").read_text(encoding="utf-8"))
+        self.prompts = {int(pid): p for pid, p in meta["prompts"].items()}
+        self.samples = np.load(pack_dir / "samples.npy", mmap_mode="r", allow_pickle=False)
+        self.parts = np.load(pack_dir / "parts.npy", mmap_mode="r", allow_pickle=False)
+        self.file = (pack_dir / "text.bin").open("rb")
+        size = (pack_dir / "text.bin").stat().st_size
+        self.blob = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if size else b""
+
+    def __len__(self) -> int:
+        return len(self.samples)
+
+    def text(self, i: int) -> str:
+        row = self.samples[i]
+        return self.blob[row["offset"]:row["offset"] + row["length"]].decode(*ENCODING)
+
+    def part_text(self, i: int, part: int) -> str:
+        """One part of output i, decoded from just its own bytes."""
+        row = self.samples[i]
+        spans = self.parts[row["first_part"]:row["first_part"] + row["n_parts"]]
+        hits = np.flatnonzero(spans["part"] == part)
+        if not len(hits):
+            raise KeyError(part)
+        span = spans[hits[0]]
+        return self.blob[row["offset"] + span["byte_start"]:row["offset"] + span["byte_end"]].decode(*ENCODING)
+
+    def record(self, i: int) -> OutputRecord:
+        row = self.samples[i]
+        pid = int(row["prompt_id"])
+        prompt = self.prompts[pid]
+        return OutputRecord(pid, prompt["prompt_type"], int(row["sample_id"]), prompt["verification"], self.text(i))
+
+    def part_views(self, i: int, text: str) -> dict:
+        """{n: PartView} of output i over its decoded text, without re-slicing."""
+        row = self.samples[i]
+        spans = self.parts[row["first_part"]:row["first_part"] + row["n_parts"]]
+        return {n: PartView(n, s, e, text)
+                for n, s, e in zip(spans["part"].tolist(), spans["start"].tolist(), spans["end"].tolist())}
+
+    def bounds(self, only: set = None):
+        """Yield (pid, lo, hi) per prompt, in pack order: its outputs are
+        samples lo to hi - 1. Only prompts whose pid is in only, when given."""
+        pids = self.samples["prompt_id"]
+        if not len(pids):
+            return
+        bounds = np.flatnonzero(pids[1:] != pids[:-1]) + 1
+        for lo, hi in zip([0, *bounds.tolist()], [*bounds.tolist(), len(pids)]):
+            if only is None or int(pids[lo]) in only:
+                yield int(pids[lo]), lo, hi
+
+    def group(self, lo: int, hi: int):
+        """(pid, records, views) of the prompt whose outputs are samples lo to hi - 1."""
+        records = [self.record(i) for i in range(lo, hi)]
+        views = [self.part_views(i, rec.output) for i, rec in zip(range(lo, hi), records)]
+        return records[0].prompt_id, records, views
+
+    def groups(self, only: set = None):
+        """Yield (pid, records, views) one prompt at a time, in pack order;
+        only those prompts whose pid is in only, when given."""
+        for _, lo, hi in self.bounds(only):
+            yield self.group(lo, hi)
+
+    def close(self):
+        if isinstance(self.blob, mmap.mmap):
+            self.blob.close()
+        self.file.close()
@@ -0,0 +1,113 @@
+# helpers/part_table.py
+import os
+import pathlib
+import shutil
+import tempfile
+
+import numpy as np
+
+from helpers.metrics import hard_metric_array, level_codes
+from helpers.storage import copy_range
+
+# one row per (prompt, output, part); level and relation use LEVEL_CODES and
+# RELATION_CODES from helpers/metrics.py, output_idx and part start at 1
+PART_DTYPE = np.dtype([
+    ("prompt_id", np.int32),
+    ("output_idx", np.int32),
+    ("part", np.int16),
+    ("level", np.int8),
+    ("relation", np.int8),
+    ("lo", np.int64),
+    ("hi", np.int64),
+    ("measured", np.int64),
+    ("hard", np.int8),
+])
+
+
+def build_part_table(plans: dict, measured: dict) -> np.ndarray:
+    """Flatten {pid: ConstraintPlan} and {pid: [{part: count}]} into rows,
+    in prompt, output and part order."""
+    rows = sum(plan.parts * len(measured[pid]) for pid, plan in plans.items())
+    table = np.zeros(rows, dtype=PART_DTYPE)
+    at = 0
+    for pid, plan in plans.items():
+        n, outs = plan.parts, len(measured[pid])
+        rows = slice(at, at + n * outs)
+        table["prompt_id"][rows] = pid
+        table["output_idx"][rows] = np.repeat(np.arange(1, outs + 1), n)
+        table["part"][rows] = np.tile(np.arange(1, n + 1), outs)
+        table["level"][rows] = np.tile(level_codes(plan.levels), outs)
+        table["relation"][rows] = np.tile(plan.codes, outs)
+        table["lo"][rows] = np.tile(plan.lo, outs)
+        table["hi"][rows] = np.tile(plan.hi, outs)
+        table["measured"][rows] = [m[k] for m in measured[pid] for k in range(1, n + 1)]
+        at += n * outs
+    table["hard"] = hard_metric_array(table["relation"], table["measured"], table["lo"], table["hi"])
+    return table
+
+
+def save_part_table(path, table: np.ndarray):
+    np.save(path, table, allow_pickle=False)
+
+
+def load_part_table(path) -> np.ndarray:
+    # memory-mapped; rows are paged in as a group-by reads them
+    return np.load(path, mmap_mode="r", allow_pickle=False)
+
+
+class PartTableSpool:
+    """Part table rows streamed to a temp file as prompts are scored.
+
+    table() maps them back as one read-only array and save() writes the
+    same .npy that save_part_table() would, so only one prompt's rows are
+    ever held in memory. After resume() the rows of an earlier table come
+    first, copied over by save() without being read.
+    """
+
+    def __init__(self):
+        self.tmp = tempfile.TemporaryFile()
+        self.rows = 0
+        self.base = None    # (path, data offset, rows) of the earlier table
+
+    def append(self, table: np.ndarray):
+        self.tmp.write(np.ascontiguousarray(table, dtype=PART_DTYPE).tobytes())
+        self.rows += len(table)
+
+    def resume(self, path) -> int:
+        """Continue after the rows of a saved part table; returns how many there were."""
+        with open(path, "rb") as f:
+            version = np.lib.format.read_magic(f)
+            read_header = np.lib.format.read_array_header_1_0 if version == (1, 0) else np.lib.format.read_array_header_2_0
+            shape, _, _ = read_header(f)
+            self.base = (path, f.tell(), shape[0])
+        self.rows = shape[0]
+        return self.rows
+
+    def table(self) -> np.ndarray:
+        self.tmp.flush()
+        new = self.rows - (self.base[2] if self.base else 0)
+        rows = np.memmap(self.tmp, dtype=PART_DTYPE, mode="r", shape=(new,)) if new else np.zeros(0, PART_DTYPE)
+        return np.concatenate([load_part_table(self.base[0]), rows]) if self.base else rows
+
+    def save(self, path):
+        header = {"descr": np.lib.format.dtype_to_descr(PART_DTYPE), "fortran_order": False, "shape": (self.rows,)}
+        self.tmp.flush()
+        self.tmp.seek(0)
+        # written next to path and renamed over it: the earlier table may be path itself
+        tmp_path = pathlib.Path(path).with_name(pathlib.Path(path).name + ".tmp")
+        with open(tmp_path, "wb") as out:
+            np.lib.format.write_array_header_1_0(out, header)
+            if self.base:
+                base, offset, rows = self.base
+                copy_range(base, offset, rows * PART_DTYPE.itemsize, out)
+            shutil.copyfileobj(self.tmp, out, 1 << 20)
+        os.replace(tmp_path, path)
+
+    def clear(self):
+        self.tmp.seek(0)
+        self.tmp.truncate()
+        self.rows = 0
+        self.base = None
+
+    def close(self):
+        self.tmp.close()
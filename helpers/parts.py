@@ -0,0 +1,189 @@
+# helpers/parts.py
+import copy
+import re
+from typing import NamedTuple
+
+from helpers.counting import BULLET_CHARS, EXTRA_BREAK_RE, StreamCounter, TextStats, word_count
+
+PART_HEADER_RE = re.compile(r"(?mi)^#part\s*(\d+)\s*$")
+NON_SPACE_RE = re.compile(r"\S")
+
+
+class PartView(NamedTuple):
+    """One '#part n' section, kept as offsets into the output it came from.
+
+    [start, end) is already whitespace-trimmed, so source[start:end] equals
+    what slice_parts() would return for the same part.
+    """
+    part: int
+    start: int
+    end: int
+    source: str
+
+    @property
+    def text(self) -> str:
+        # only copies when a caller really needs the string
+        return self.source[self.start:self.end]
+
+
+def trimmed_span(content: str, s: int, e: int):
+    """[s, e) with leading and trailing whitespace dropped, no copying."""
+    m = NON_SPACE_RE.search(content, s, e)
+    if m is None:
+        return s, s
+    s = m.start()
+    while content[e - 1].isspace():
+        e -= 1
+    return s, e
+
+
+def slice_part_views(content: str):
+    """Like slice_parts, but {n: PartView} instead of copied substrings."""
+    headers = list(PART_HEADER_RE.finditer(content))
+    views = {}
+    for j, hdr in enumerate(headers):
+        n = int(hdr.group(1))
+        e = headers[j + 1].start() if j + 1 < len(headers) else len(content)
+        views[n] = PartView(n, *trimmed_span(content, hdr.end(), e), content)
+    return views
+
+
+def scan_parts(content: str):
+    """slice_parts and text_stats fused into one walk over content's lines.
+
+    Returns {n: TextStats}, equal to text_stats(slice_parts(content)[n]),
+    without building the part strings first.
+    """
+    plain_breaks = EXTRA_BREAK_RE.search(content) is None
+    stats = {}
+    part = None          # number of the part being read, None before the first header
+    header_end = -1      # lines up to here belong to a (multi-line) header
+    pos = 0
+    for i, seg in enumerate(content.split("\n")):
+        if pos < header_end:
+            pos += len(seg) + 1
+            continue
+        hdr = PART_HEADER_RE.match(content, pos) if seg[:1] == "#" else None
+        if hdr is not None:
+            if part is not None:
+                stats[part] = TextStats(words, lines, paragraphs, bullets, end - start)
+            part = int(hdr.group(1))
+            header_end = hdr.end()
+            words = lines = paragraphs = bullets = 0
+            start = end = 0
+            last = -1         # index of the previous non-blank line
+            pending = False   # a bare bullet marker waiting for its item text
+        elif part is not None:
+            body = seg.lstrip()
+            if body:
+                words += word_count(body)
+                if plain_breaks:
+                    lines += 1
+                else:
+                    lines += sum(1 for ln in seg.splitlines() if ln.strip())
+                if last < 0:
+                    start = pos + len(seg) - len(body)
+                end = pos + len(seg.rstrip())
+                if last < 0 or i - last >= 2:
+                    paragraphs += 1
+                last = i
+                if pending:
+                    bullets += 1
+                    pending = False
+                elif body[0] in BULLET_CHARS:
+                    rest = body[1:]
+                    if not rest.strip():
+                        pending = True
+                    elif rest[0].isspace():
+                        bullets += 1
+        pos += len(seg) + 1
+    # a part is trimmed, so a bare marker left at its end never matches
+    if part is not None:
+        stats[part] = TextStats(words, lines, paragraphs, bullets, end - start)
+    return stats
+
+
+# a header line that is complete, and the beginning of one that may still
+# turn into a header once more text arrives
+HEADER_LINE_RE = re.compile(r"#part\s*(\d+)[^\S\n]*\n", re.I)
+HEADER_PREFIX_RE = re.compile(r"#(?:p(?:a(?:r(?:t\s*(?:\d+[^\S\n]*)?)?)?)?)?", re.I)
+HEADER_END_RE = re.compile(r"#part\s*(\d+)\s*", re.I)
+
+
+def feed_trimmed(counter: StreamCounter, pending: str, text: str) -> str:
+    """Feed text to counter as part of a part that is stripped at both ends.
+
+    Leading whitespace is dropped and trailing whitespace held back, so
+    the counter only ever sees the stripped part; returns the whitespace
+    still held back.
+    """
+    if not counter.chars:
+        text = text.lstrip()
+    body = text.rstrip()
+    if not body:
+        return pending + text
+    counter.feed(pending + body)
+    return text[len(body):]
+
+
+class PartStreamCounter:
+    """Running scan_parts() for an output that arrives in chunks.
+
+    After any sequence of chunks stats() equals scan_parts() of everything
+    fed so far, i.e. text_stats() of each part slice_parts() would cut.
+    A line starting with '#' is held back until it is known whether it is
+    a '#part n' header; everything else is counted as it arrives. Parts
+    that another header has closed are appended to finished as (n, stats).
+    """
+
+    def __init__(self):
+        self.counters = {}
+        self.finished = []
+        self.part = None          # number of the part being written
+        self.pending = ""         # trailing whitespace of that part
+        self.hold = ""            # a line that may still become a header
+        self.line_start = True
+
+    def feed(self, delta: str):
+        text = self.hold + delta
+        self.hold = ""
+        i = 0
+        while i < len(text):
+            if self.line_start and text[i] == "#":
+                hdr = HEADER_LINE_RE.match(text, i)
+                if hdr:
+                    self.start_part(int(hdr.group(1)))
+                    i = hdr.end()
+                    continue
+                if HEADER_PREFIX_RE.fullmatch(text, i):
+                    self.hold = text[i:]
+                    return
+            j = text.find("\n", i)
+            end = len(text) if j < 0 else j + 1
+            self.emit(text[i:end])
+            self.line_start = j >= 0
+            i = end
+
+    def start_part(self, n: int):
+        if self.part is not None:
+            self.finished.append((self.part, self.counters[self.part].stats()))
+        self.counters[n] = StreamCounter()
+        self.part = n
+        self.pending = ""
+
+    def emit(self, text: str):
+        if self.part is not None:
+            self.pending = feed_trimmed(self.counters[self.part], self.pending, text)
+
+    def stats(self):
+        """{n: TextStats} of the parts so far, the last one still growing."""
+        stats = {n: c.stats() for n, c in self.counters.items()}
+        if self.hold:
+            hdr = HEADER_END_RE.fullmatch(self.hold)
+            if hdr:
+                stats[int(hdr.group(1))] = StreamCounter().stats()
+            elif self.part is not None:
+                counter = copy.copy(self.counters[self.part])
+                feed_trimmed(counter, self.pending, self.hold)
+                stats[self.part] = counter.stats()
+        return stats
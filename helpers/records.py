@@ -0,0 +1,130 @@
+# helpers/records.py
+import json
+import pathlib
+from typing import NamedTuple, Union
+
+from helpers.storage import find_variant, open_stream, plain_path
+
+try:
+    import msgspec
+except ImportError:  # fall back to the json module
+    msgspec = None
+
+VERIFICATION_KEY = '"verification":'
+JSON_DECODER = json.JSONDecoder()
+# prompt fields kept once per prompt in the prompts table, not in every record
+PROMPT_FIELDS = ("prompt_type", "verification")
+
+
+class OutputRecord(NamedTuple):
+    """One line of a *_output.jsonl file, as generation.write_jsonl_line writes it.
+
+    verification is shared by every record of the same prompt.
+    """
+    prompt_id: int
+    prompt_type: str
+    sample_id: int
+    verification: dict
+    output: str
+
+
+if msgspec is not None:
+    class WireRecord(msgspec.Struct):
+        prompt_id: Union[int, str]
+        output: str
+        prompt_type: str = ""
+        sample_id: Union[int, str] = 0
+        # kept as raw bytes, decoded once per distinct spec; empty when the
+        # record leaves it to the prompts table
+        verification: msgspec.Raw = msgspec.Raw(b"")
+
+
+def prompts_table_path(outputs_path: pathlib.Path) -> pathlib.Path:
+    # gpt-4.1_output.jsonl -> gpt-4.1_output.prompts.jsonl, keeping any
+    # compression suffix: gpt-4.1_output.jsonl.gz -> gpt-4.1_output.prompts.jsonl.gz
+    outputs_path = pathlib.Path(outputs_path)
+    plain = plain_path(outputs_path)
+    return plain.with_suffix(".prompts.jsonl" + outputs_path.name[len(plain.name):])
+
+
+def load_prompts_table(outputs_path: pathlib.Path) -> dict:
+    """{prompt_id: row} from the prompts table next to an output file.
+
+    Empty for the older layout, where every record repeats its prompt's
+    fields.
+    """
+    table = {}
+    path = find_variant(prompts_table_path(plain_path(outputs_path)))
+    if path.exists():
+        with open_stream(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    row = json.loads(line)
+                    table[int(row["prompt_id"])] = row
+    return table
+
+
+def write_prompt_row(f, prompt_row: dict, fields=PROMPT_FIELDS):
+    row = {"prompt_id": prompt_row["prompt_id"]}
+    row.update((k, prompt_row.get(k)) for k in fields)
+    f.write(json.dumps(row, ensure_ascii=False) + "\n")
+    f.flush()
+
+
+class RecordDecoder:
+    """Decode output lines into OutputRecords, interning verification specs.
+
+    Every record repeats its prompt's verification; the spec is decoded the
+    first time a prompt is seen and reused whenever a later line carries the
+    same bytes. Records in the normalized layout leave prompt fields out and
+    get them from prompts, the file's prompts table. Uses msgspec when
+    installed, the json module otherwise.
+    """
+
+    def __init__(self, prompts: dict = None):
+        self.prompts = prompts or {}
+        self.specs = {}   # pid -> (raw spec text/bytes, decoded spec)
+        if msgspec is not None:
+            self.wire = msgspec.json.Decoder(WireRecord)
+
+    def intern(self, pid: int, raw, decode):
+        cached = self.specs.get(pid)
+        if cached is not None and cached[0] == raw:
+            return cached[1]
+        spec = decode(raw)
+        self.specs[pid] = (raw, spec)
+        return spec
+
+    def decode(self, pid: int, line) -> OutputRecord:
+        """Decode one line whose prompt_id is already known to be pid."""
+        if msgspec is not None:
+            rec = self.wire.decode(line)
+            prompt = self.prompts.get(pid, {})
+            if len(rec.verification):
+                spec = self.intern(pid, bytes(rec.verification), msgspec.json.decode)
+            else:
+                spec = prompt.get("verification") or {}
+            return OutputRecord(pid, rec.prompt_type or prompt.get("prompt_type") or "",
+                                int(rec.sample_id), spec, rec.output)
+        text = line.decode("utf-8") if isinstance(line, bytes) else line
+        # a raw '"verification":' can only be a key, since quotes inside JSON
+        # strings are escaped; splice the value out and parse the rest
+        i = text.find(VERIFICATION_KEY)
+        prompt = self.prompts.get(pid, {})
+        if i < 0:
+            obj = json.loads(text)
+            spec = obj.get("verification", prompt.get("verification") or {})
+        else:
+            j = i + len(VERIFICATION_KEY)
+            while text[j].isspace():
+                j += 1
+            cached = self.specs.get(pid)
+            if cached is not None and text.startswith(cached[0], j):
+                raw, spec = cached
+            else:
+                spec, end = JSON_DECODER.raw_decode(text, j)
+                raw = text[j:end]
+                self.specs[pid] = (raw, spec)
+            obj = json.loads(text[:j] + "null" + text[j + len(raw):])
+        return OutputRecord(pid, obj.get("prompt_type", prompt.get("prompt_type") or ""),
+                            int(obj.get("sample_id", 0)), spec, obj["output"])
@@ -0,0 +1,105 @@
+# helpers/storage.py
+import gzip
+import io
+import lzma
+import os
+import pathlib
+
+try:
+    import zstandard
+except ImportError:  # .zst files need the zstandard package
+    zstandard = None
+
+# compression is picked from the last suffix: x_output.jsonl.gz, .xz, .zst
+COMPRESSED_SUFFIXES = (".gz", ".xz", ".lzma", ".zst")
+
+
+def open_stream(path, mode: str = "rt", encoding: str = "utf-8"):
+    """open() that (de)compresses gzip/lzma/zstd files on the fly.
+
+    Reads and writes stream in chunks, so a compressed file is never
+    inflated in memory as a whole. Text modes ("r", "a", "w", "rt", ...)
+    use encoding; binary modes ("rb", "ab", ...) return bytes.
+    """
+    path = pathlib.Path(path)
+    if "b" not in mode and "t" not in mode:
+        mode += "t"
+    text = {"encoding": encoding} if "t" in mode else {}
+    suffix = path.suffix
+    if suffix == ".gz":
+        return gzip.open(path, mode, **text)
+    if suffix in (".xz", ".lzma"):
+        return lzma.open(path, mode, **text)
+    if suffix == ".zst":
+        if zstandard is None:
+            raise ImportError(f"reading or writing {path} needs the zstandard package")
+        stream = zstandard.open(path, mode, **text)
+        # the raw zstd reader has no readline(); buffer it so it iterates by line
+        return io.BufferedReader(stream) if mode == "rb" else stream
+    return path.open(mode, **text)
+
+
+def is_compressed(path) -> bool:
+    return pathlib.Path(path).suffix in COMPRESSED_SUFFIXES
+
+
+def plain_path(path) -> pathlib.Path:
+    """The path without its compression suffix: a.jsonl.gz -> a.jsonl."""
+    path = pathlib.Path(path)
+    return path.with_suffix("") if is_compressed(path) else path
+
+
+def find_variant(path) -> pathlib.Path:
+    """path itself if it exists, else an existing compressed copy of it."""
+    path = pathlib.Path(path)
+    if path.exists():
+        return path
+    for suffix in COMPRESSED_SUFFIXES:
+        candidate = path.with_name(path.name + suffix)
+        if candidate.exists():
+            return candidate
+    return path
+
+
+def skip_to(f, offset: int):
+    """Move the binary stream f, still at its start, to offset.
+
+    The zstd reader can't seek, so there the bytes before offset are read
+    and dropped; gzip and lzma files seek the same way internally.
+    """
+    if f.seekable():
+        f.seek(offset)
+        return
+    while offset:
+        chunk = f.read(min(offset, 1 << 20))
+        if not chunk:
+            break
+        offset -= len(chunk)
+
+
+def copy_range(src, start: int, length: int, out):
+    """Append length bytes of file src, from start, to the binary file out.
+
+    The kernel copies them where it can (os.copy_file_range), so they never
+    pass through Python, and filesystems with reflinks share them instead.
+    """
+    out.flush()
+    with open(src, "rb") as f:
+        while length and hasattr(os, "copy_file_range"):
+            try:
+                n = os.copy_file_range(f.fileno(), out.fileno(), length, start)
+            except OSError:    # e.g. not supported between these filesystems
+                break
+            if not n:
+                break
+            start += n
+            length -= n
+        f.seek(start)
+        while length:
+            chunk = f.read(min(length, 1 << 20))
+            if not chunk:
+                raise EOFError(f"{src} ended {length} bytes early")
+            out.write(chunk)
+            length -= len(chunk)
+    # the file position moved under out's buffer
+    out.seek(0, os.SEEK_END)
@@ -1,7 +1,11 @@
-import json, pathlib, re, statistics, os
+import argparse, json, mmap, pathlib, re, shutil, statistics, os, tempfile
+from contextlib import contextmanager
 from collections import defaultdict
 from helpers.counting import word_count, paragraph_count, line_count
 from helpers.metrics import parse_target, hard_metric
+from helpers.cache import CountCache
+from helpers.parts import scan_parts
+from helpers.storage import find_variant, is_compressed, open_stream, plain_path
 # from helpers.metrics import soft_metric_basic, soft_metric_advanced  
 
 #constant declaration
@@ -13,8 +17,10 @@ MODEL_FILES = [
 ]
 VERIFICATION_PATH = DATA_DIR / "segmented.jsonl"
 OUTDIR = DATA_DIR
-#to split into prompts
-PROMPT_SPLIT_RE = re.compile(r"^##\s*prompt_id:\s*(\d+)\s*,\s*type:\s*segmented\s*$", re.MULTILINE)
+#to split into prompts, matched on the raw bytes; generation.py also writes a sample_id
+PROMPT_SPLIT_RE = re.compile(
+    rb"^##\s*prompt_id:\s*(\d+)\s*,\s*type:\s*segmented(?:\s*,\s*sample_id:\s*\d+)?\s*$", re.MULTILINE
+)
 #to split into parts
 PART_HEADER_RE = re.compile(r"(?mi)^#part\s*(\d+)\s*$")
 
@@ -27,7 +33,7 @@ LEVEL_COUNTERS = {
 # store all verification ruls into verifs
 def load_verifications(segmented_jsonl_path: pathlib.Path):
     verifs = {}
-    with segmented_jsonl_path.open("r", encoding="utf-8") as f:
+    with open_stream(find_variant(segmented_jsonl_path), "r") as f:
         for line in f:
             if not line.strip():
                 continue
@@ -37,20 +43,68 @@ def load_verifications(segmented_jsonl_path: pathlib.Path):
             verifs[int(obj["prompt_id"])] = obj["verification"]
     return verifs
 
-#parse prompts
-def parse_model_outputs(path: pathlib.Path):
-    txt = path.read_text(encoding="utf-8", errors="ignore")
-    matches = list(PROMPT_SPLIT_RE.finditer(txt))
-    per_prompt = defaultdict(list)
-    for i, m in enumerate(matches):
-        pid = int(m.group(1))
-        start = m.end()
-        end = matches[i + 1].start() if i + 1 < len(matches) else len(txt)
-        content = txt[start:end].strip()
-        per_prompt[pid].append((i, content))
-    for pid in per_prompt:
-        per_prompt[pid].sort(key=lambda t: t[0])
-    return per_prompt
+# map the transcript read-only; pages are only read when a block is decoded.
+# a compressed transcript is first inflated chunk by chunk into a temp file
+@contextmanager
+def open_transcript(path: pathlib.Path):
+    with (tempfile.TemporaryFile() if is_compressed(path) else path.open("rb")) as f:
+        if is_compressed(path):
+            with open_stream(path, "rb") as src:
+                shutil.copyfileobj(src, f, 1 << 20)
+            f.flush()
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield buf
+        finally:
+            buf.close()
+
+# lazily yield (prompt_id, start, end) byte spans of every sample block
+def iter_output_spans(buf):
+    prev = None
+    for m in PROMPT_SPLIT_RE.finditer(buf):
+        if prev is not None:
+            yield int(prev.group(1)), prev.end(), m.start()
+        prev = m
+    if prev is not None:
+        yield int(prev.group(1)), prev.end(), len(buf)
+
+# decode one sample block only when it is about to be counted
+def read_output(buf, start: int, end: int) -> str:
+    return buf[start:end].decode("utf-8", errors="ignore").strip()
+
+# True when every prompt's sample blocks sit next to each other
+def spans_are_grouped(buf) -> bool:
+    seen, prev = set(), None
+    for pid, _, _ in iter_output_spans(buf):
+        if pid != prev:
+            if pid in seen:
+                return False
+            seen.add(pid)
+            prev = pid
+    return True
+
+#parse prompts: yield (pid, [(ordinal, start, end)]) one prompt at a time, offsets only, no text
+def parse_model_outputs(buf):
+    spans = enumerate(iter_output_spans(buf))
+    if not spans_are_grouped(buf):
+        # a prompt's blocks are scattered, so every offset is collected first
+        per_prompt = defaultdict(list)
+        for i, (pid, start, end) in spans:
+            per_prompt[pid].append((i, start, end))
+        yield from per_prompt.items()
+        return
+    pid, outs = None, []
+    for i, (span_pid, start, end) in spans:
+        if span_pid != pid and outs:
+            yield pid, outs
+            outs = []
+        pid = span_pid
+        outs.append((i, start, end))
+    if outs:
+        yield pid, outs
 
 #parse parts
 def slice_parts(content: str):
@@ -66,7 +120,9 @@ def slice_parts(content: str):
     return parts
 
 # get actual count
-def measure(level: str, text: str) -> int:
+def measure(level: str, text: str, cache: CountCache = None) -> int:
+    if cache:
+        return cache.count(level, text, measure)
     counter = LEVEL_COUNTERS.get(level)
     return counter(text) if counter else 0
 
@@ -83,10 +139,11 @@ def part_scores(relation: str, actual: int, target):
     }
 
 # evaluate a single output/sample
-def verify_output(prompt_id: int, content: str, vtag: dict):
+def verify_output(prompt_id: int, content: str, vtag: dict, cache: CountCache = None):
     exp_n = int(vtag["part_number"])
     #slice_parts(content: str), return parts
-    parts = slice_parts(content)
+    # without a cache, one pass slices the parts and counts every level
+    parts = scan_parts(content) if cache is None else slice_parts(content)
     if not parts:
         return {
             "format_valid": False,
@@ -107,7 +164,10 @@ def verify_output(prompt_id: int, content: str, vtag: dict):
         level = spec["level"]
         relation = spec["relation"]
         target_raw = spec["target"]
-        actual = measure(level, parts.get(k, ""))
+        if cache is None:
+            actual = parts[k].count(level) if k in parts else 0
+        else:
+            actual = measure(level, parts.get(k, ""), cache)
         target = parse_target(relation, target_raw)
         scores_dict = part_scores(relation, actual, target)
         for key, val in scores_dict.items():
@@ -136,22 +196,26 @@ def verify_output(prompt_id: int, content: str, vtag: dict):
     }
 
 # evaluate one model file
-def evaluate_model_file(model_file: pathlib.Path, vtags: dict):
-    model_name = model_file.stem
-    #def parse_model_outputs(path: pathlib.Path). dict that contains all all prompt_id-sample pair
-    per_prompt = parse_model_outputs(model_file)
+def evaluate_model_file(model_file: pathlib.Path, vtags: dict, cache: CountCache = None):
+    model_name = plain_path(model_file).stem
+    with open_transcript(model_file) as buf:
+        return evaluate_transcript(model_name, buf, vtags, cache)
+
+def evaluate_transcript(model_name: str, buf, vtags: dict, cache: CountCache = None):
+    #def parse_model_outputs(buf). prompt_id-sample spans, one prompt at a time
     prompt_acc, invalid, mismatches, per_output = {}, [], [], []
     #for every prompt
-    for pid, outs in per_prompt.items():
+    for pid, outs in parse_model_outputs(buf):
         if pid not in vtags:
             continue
         expected_parts = int(vtags[pid]["part_number"])
         metric_sums = {"hard": []}  # extendable to multiple metrics
 
         #every output
-        for j, (_ord, content) in enumerate(outs, start=1):
+        for j, (_ord, start, end) in enumerate(outs, start=1):
+            content = read_output(buf, start, end)
             # def verify_output(prompt_id: int, content: str, vtag: dict), result for one sample
-            res = verify_output(pid, content, vtags[pid])
+            res = verify_output(pid, content, vtags[pid], cache)
             #details for each output
             per_output.append({
                 "prompt_id": pid,
@@ -211,23 +275,34 @@ def evaluate_model_file(model_file: pathlib.Path, vtags: dict):
     }
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache", type=pathlib.Path, help="SQLite file that keeps part counts between runs")
+    args = parser.parse_args()
+
     #get verification tags
     vtags = load_verifications(VERIFICATION_PATH)
+    cache = CountCache(args.cache) if args.cache else None
     # entire results for 3 models
     results = []
-    for mf in MODEL_FILES:
-        if not mf.exists():
-            print(f"[skip] {mf} not found (cwd={os.getcwd()})")
-            continue
+    try:
+        for mf in MODEL_FILES:
+            # a compressed copy (x_output.txt.gz, ...) stands in for a missing file
+            mf = find_variant(mf)
+            if not mf.exists():
+                print(f"[skip] {mf} not found (cwd={os.getcwd()})")
+                continue
 
-        model_name = mf.stem
-        print(model_name)
+            model_name = plain_path(mf).stem
+            print(model_name)
 
-        #def evaluate_model_file(model_file: pathlib.Path, vtags: dict), result of one model
-        res = evaluate_model_file(mf, vtags)
-        results.append(res)
-        out_path = OUTDIR / f"{res['model']}_eval.json"
-        out_path.write_text(json.dumps(res, ensure_ascii=False, indent=2), encoding="utf-8")
+            #def evaluate_model_file(model_file: pathlib.Path, vtags: dict), result of one model
+            res = evaluate_model_file(mf, vtags, cache)
+            results.append(res)
+            out_path = OUTDIR / f"{res['model']}_eval.json"
+            out_path.write_text(json.dumps(res, ensure_ascii=False, indent=2), encoding="utf-8")
+    finally:
+        if cache:
+            cache.close()
 
     # no models being processed
     if not results:
@@ -6,6 +6,7 @@ import concurrent.futures as cf
 from openai import OpenAI
 import os
 import argparse
+from helper import load_prompts_table, open_stream, prompts_table_path, write_prompt_rows
 
 # ---------------------------------------------------------------------------
 # API Clients
@@ -90,9 +91,8 @@ def generate_samples(model_key: str, prompt_row: dict):
                 print(f"[{model_key}] Prompt {prompt_row.get('prompt_id')} error: {e}", file=sys.stderr)
                 time.sleep(10)
         print(f"[{model_key}] Generated output for Prompt {prompt_row.get('prompt_id')} Sample {sid}")
+        # category and constraint go to the prompts table once per prompt
         rec = {
-            "category": prompt_row.get("category"),
-            "constraint": prompt_row.get("constraint"),
             "prompt_id": prompt_row.get("prompt_id"),
             "sample_id": sid,
             "text": text
@@ -100,26 +100,29 @@ def generate_samples(model_key: str, prompt_row: dict):
         result.append(rec)
     return result
 
-def write_jsonl(path: Path, records):
-    """Append a list of records to a JSONL file (deduplicate by prompt_id+sample_id)."""
+def written_keys(path: Path):
+    """(prompt_id, sample_id) of every record already in a JSONL file."""
     existing = set()
     if path.exists():
-        with path.open("r", encoding="utf-8") as f:
+        with open_stream(path, "r") as f:
             for line in f:
                 try:
                     rec = json.loads(line)
                     existing.add((rec.get("prompt_id"), rec.get("sample_id")))
                 except:
                     continue
-
-    mode = "a" if path.exists() else "w"
-    with path.open(mode, encoding="utf-8") as f:
-        for rec in records:
-            key = (rec["prompt_id"], rec["sample_id"])
-            if key in existing:
-                continue
-            json.dump(rec, f, ensure_ascii=False)
-            f.write("\n")
+    return existing
+
+def write_jsonl(f, records, existing):
+    """Append a list of records to an open JSONL file (deduplicate by prompt_id+sample_id)."""
+    for rec in records:
+        key = (rec["prompt_id"], rec["sample_id"])
+        if key in existing:
+            continue
+        json.dump(rec, f, ensure_ascii=False)
+        f.write("\n")
+        existing.add(key)
+    f.flush()
 
 def get_resume_point(path: Path):
     """Return the prompt_id to start from.
@@ -131,7 +134,7 @@ def get_resume_point(path: Path):
     last_prompt_id = 0
     samples_seen = {}
 
-    with path.open("r", encoding="utf-8") as f:
+    with open_stream(path, "r") as f:
         for line in f:
             try:
                 rec = json.loads(line)
@@ -157,12 +160,15 @@ def get_resume_point(path: Path):
 def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--resume", action="store_true", help="Continue from last unfinished prompt")
+    parser.add_argument("--compress", choices=["gz", "xz", "zst"], help="Write outputs compressed (.jsonl.gz, ...)")
     args = parser.parse_args()
 
     prompts = load_prompts(PROMPTS_FILE)
 
     for mkey in models:
         out_file = DATA_DIR / f"{mkey}_outputs.jsonl"
+        if args.compress:
+            out_file = out_file.with_name(f"{out_file.name}.{args.compress}")
 
         if args.resume:
             start_pid = get_resume_point(out_file)
@@ -174,14 +180,22 @@ def main():
         else:
             if out_file.exists():
                 out_file.unlink()
+            if prompts_table_path(out_file).exists():
+                prompts_table_path(out_file).unlink()
             print(f"[{mkey}] Fresh mode: starting from Prompt 1")
             remaining_prompts = prompts
 
         print(f"==> {mkey}: {len(remaining_prompts)} prompts to generate")
-        with cf.ThreadPoolExecutor(max_workers=4) as pool:
+        # one handle per file for the whole run: with --compress, each open in
+        # append mode would start another compressed member
+        existing, known = written_keys(out_file), load_prompts_table(out_file)
+        with cf.ThreadPoolExecutor(max_workers=4) as pool, \
+                open_stream(out_file, "a") as out, open_stream(prompts_table_path(out_file), "a") as table:
             futures = [pool.submit(generate_samples, mkey, p) for p in remaining_prompts]
-            for task in futures:
-                write_jsonl(out_file, task.result())
+            for p, task in zip(remaining_prompts, futures):
+                records = task.result()
+                write_prompt_rows(table, [p], known)
+                write_jsonl(out, records, existing)
 
         print(f"[{mkey}] Finished. Results saved to {out_file}")
 
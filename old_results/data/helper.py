@@ -1,5 +1,42 @@
+import pathlib
 import re
+import sys
 from langdetect import detect
+
+# compressed files and the prompts table are handled by the repository's
+# helpers package, the same code evaluation.py reads them with
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[2]))
+from helpers.records import load_prompts_table, prompts_table_path, write_prompt_row
+from helpers.storage import find_variant, open_stream, plain_path
+
+NON_SPACE_RE = re.compile(r"\S")
+# prompt fields advanced_generator.py keeps once per prompt, not per sample
+PROMPT_FIELDS = ("category", "constraint")
+
+# append to the open prompts table f the rows of prompts not in known yet
+# (known is load_prompts_table() of it, and is kept up to date)
+def write_prompt_rows(f, prompt_rows, known, fields=PROMPT_FIELDS):
+    for p in prompt_rows:
+        if p["prompt_id"] not in known:
+            write_prompt_row(f, p, fields)
+            known[p["prompt_id"]] = p
+
+# (start, end) of each p.strip() in text.split(sep) that is non-empty,
+# without copying the pieces out of text
+def split_spans(text: str, sep: str = "\n\n"):
+    pos = 0
+    while pos <= len(text):
+        cut = text.find(sep, pos)
+        end = cut if cut >= 0 else len(text)
+        m = NON_SPACE_RE.search(text, pos, end)
+        if m:
+            stop = end
+            while text[stop - 1].isspace():
+                stop -= 1
+            yield m.start(), stop
+        if cut < 0:
+            break
+        pos = cut + len(sep)
 #1
 def check_letter_frequency(text: str, v: dict) -> bool:
     # v: {"relation": "gte"|"eq", "letter": "a", "target": 80}
@@ -79,19 +116,18 @@ def check_must_mention_placeholders(text: str, v: dict) -> bool:
 #8
 def check_paragraph_first_word(text: str, v: dict) -> bool:
     # v: {"options": ["However", "In conclusion", "A"]}
-    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
-    options = [re.escape(opt) for opt in v["options"]]
+    options = [re.compile(rf"{re.escape(opt)}\b") for opt in v["options"]]
 
-    for p in paragraphs:
-        if not any(re.match(rf"^{opt}\b", p) for opt in options):
+    # match each option at the paragraph's start, bounded by its end
+    for start, end in split_spans(text):
+        if not any(opt.match(text, start, end) for opt in options):
             return False
     return True
 
 #9
 def check_section_progression(text: str, v: dict) -> bool:
     # v: {"section_number": 4}
-    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
-    return len(paragraphs) == int(v["section_number"])
+    return sum(1 for _ in split_spans(text)) == int(v["section_number"])
 
 #10
 def check_list_structure(text: str, v: dict) -> bool:
@@ -129,8 +165,7 @@ def check_list_structure(text: str, v: dict) -> bool:
 #11
 def check_multiple_responses(text: str, v: dict) -> bool:
     # v: {"target": 2}
-    paragraphs = [p.strip() for p in text.split("\n\n") if p.strip()]
-    return len(paragraphs) == int(v["target"])
+    return sum(1 for _ in split_spans(text)) == int(v["target"])
 
 #12
 def check_title_placement(text: str, v: dict) -> bool:
@@ -1,6 +1,8 @@
+import argparse
 import json
 import os
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from helper import *
 
 def ok(count: int, v: dict) -> bool:
@@ -39,20 +41,24 @@ def evaluate_sample(text: str, verification: list, constraint_type: str):
     score = (0.5 if num_check else 0) + (0.5 if add_check else 0)
     return num_check, add_check, score
 
-def evaluate_model(input_file, output_file, mkey):
+def load_verification_map(input_file):
     verification_map = {}
-    with open(input_file, "r", encoding="utf-8") as f:
+    with open_stream(find_variant(input_file), "r") as f:
         for idx, line in enumerate(f, start=1):
             line = line.lstrip("\ufeff").strip()
             if not line:
                 continue
             row = json.loads(line)
             verification_map[idx] = row["verification"]
+    return verification_map
 
+def evaluate_model(verification_map, output_file, mkey):
     prompt_results = defaultdict(list)
     constraint_map = {}
+    # normalized outputs keep each prompt's constraint in a prompts table
+    prompts_table = load_prompts_table(output_file)
 
-    with open(output_file, "r", encoding="utf-8") as f:
+    with open_stream(output_file, "r") as f:
         for idx, line in enumerate(f, start=1):
             line = line.lstrip("\ufeff").strip()
             if not line:
@@ -61,7 +67,7 @@ def evaluate_model(input_file, output_file, mkey):
             raw_pid = data.get("prompt_id")
             pid = raw_pid if isinstance(raw_pid, int) and raw_pid >= 1 else ((idx - 1) // 8) + 1
             text = data["text"]
-            constraint_type = data["constraint"]
+            constraint_type = data["constraint"] if "constraint" in data else prompts_table[pid]["constraint"]
             verification = verification_map[pid]
             num_check, add_check, score = evaluate_sample(text, verification, constraint_type)
             prompt_results[pid].append({
@@ -127,14 +133,33 @@ def evaluate_model(input_file, output_file, mkey):
     print(f"Saved result for {mkey} -> {result_file}")
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrent", action="store_true",
+                        help="evaluate the models in parallel processes, one per model")
+    args = parser.parse_args()
     input_file = "prompts_complete.jsonl"
     models = ["llama4scout", "deepseek-v3", "gpt-4.1"]
+    # the prompts are the same for every model: read them once
+    verification_map = load_verification_map(input_file)
+    output_files = {}
     for mkey in models:
-        output_file = f"{mkey}_outputs.jsonl"
+        # x_outputs.jsonl or a compressed x_outputs.jsonl.gz/.xz/.zst
+        output_file = find_variant(f"{mkey}_outputs.jsonl")
         if not os.path.exists(output_file):
             print(f"Skip {mkey}, file {output_file} not found")
             continue
-        evaluate_model(input_file, output_file, mkey)
+        output_files[mkey] = output_file
+    if not args.concurrent:
+        for mkey, output_file in output_files.items():
+            evaluate_model(verification_map, output_file, mkey)
+        return
+    # one process per model, so the slowest model sets the wall-clock time;
+    # their prints interleave, and an error shows once the earlier models finish
+    with ProcessPoolExecutor(max_workers=len(output_files) or 1) as pool:
+        futures = [pool.submit(evaluate_model, verification_map, output_file, mkey)
+                   for mkey, output_file in output_files.items()]
+        for future in futures:
+            future.result()
 
 if __name__ == "__main__":
     main()
@@ -1,9 +1,32 @@
 import json
 import os
+import pathlib
+import sys
 from collections import defaultdict
 
+import numpy as np
+
+# the shared helpers package is at the repository root
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1]))
+
+from helpers.eval_files import fresh_part_table
+
 root = os.getcwd()
 
+
+def part_averages(table):
+    # {pid: {part: mean hard}} from the part table, in first-appearance order
+    keys = table["prompt_id"].astype(np.int64) * 65536 + table["part"]
+    uniq, first, inv = np.unique(keys, return_index=True, return_inverse=True)
+    sums = np.bincount(inv, weights=table["hard"]).tolist()
+    counts = np.bincount(inv).tolist()
+    prompt_averages = {}
+    for g in np.argsort(first).tolist():
+        pid, part_id = divmod(int(uniq[g]), 65536)
+        prompt_averages.setdefault(pid, {})[part_id] = sums[g] / counts[g]
+    return prompt_averages
+
+
 model_files = {
     "gpt-4.1": "gpt-4.1_output_eval.json",
     "llama": "llama4scout_output_eval.json",
@@ -16,29 +39,31 @@ for model, filename in model_files.items():
     os.makedirs(output_dir, exist_ok=True)
     output_path = os.path.join(output_dir, f"{model}_sequential_eval.json")
 
-    with open(input_path, "r") as f:
-        data = json.load(f)
+    table_path = fresh_part_table(input_path)
+    if table_path:
+        prompt_averages = part_averages(np.load(table_path, mmap_mode="r"))
+    else:
+        with open(input_path, "r") as f:
+            data = json.load(f)
 
-    records = data["per_output_records"]
+        records = data["per_output_records"]
 
-    prompt_parts_scores = defaultdict(lambda: defaultdict(list))
+        prompt_parts_scores = defaultdict(lambda: defaultdict(list))
 
-    for rec in records:
-        pid = rec["prompt_id"]
-        parts = rec["part_results"]
-        for part_id, part_info in parts.items():
-            prompt_parts_scores[pid][int(part_id)].append(part_info["scores"]["hard"])
+        for rec in records:
+            pid = rec["prompt_id"]
+            parts = rec["part_results"]
+            for part_id, part_info in parts.items():
+                prompt_parts_scores[pid][int(part_id)].append(part_info["scores"]["hard"])
 
-    prompt_averages = {}
-    max_part_index = 0
-
-    for pid, parts in prompt_parts_scores.items():
-        part_avg = {}
-        for part_id, scores in parts.items():
-            part_avg[part_id] = sum(scores) / len(scores)
-            if part_id > max_part_index:
-                max_part_index = part_id
-        prompt_averages[pid] = part_avg
+        prompt_averages = {}
+        for pid, parts in prompt_parts_scores.items():
+            part_avg = {}
+            for part_id, scores in parts.items():
+                part_avg[part_id] = sum(scores) / len(scores)
+            prompt_averages[pid] = part_avg
+
+    max_part_index = max((part_id for parts in prompt_averages.values() for part_id in parts), default=0)
 
     final_avg = {}
     for part_idx in range(1, max_part_index + 1):
@@ -1,8 +1,10 @@
-import json, pathlib, statistics, os
+import argparse, json, pathlib, statistics, os
 from collections import defaultdict
 from helpers.counting import word_count, paragraph_count, line_count
 from helpers.metrics import parse_target
 from helpers.metrics import hard_metric
+from helpers.cache import CountCache
+from helpers.records import load_prompts_table
 import re
 from pathlib import Path
 
@@ -46,39 +48,43 @@ def slice_parts(content: str):
         parts[n] = content[s:e].strip()
     return parts
 
-def measure(level: str, text: str) -> int:
+def measure(level: str, text: str, cache: CountCache = None) -> int:
+    if cache:
+        return cache.count(level, text, measure)
     counter = LEVEL_COUNTERS.get(level)
     return counter(text) if counter else 0
 
-def score_last_part(content: str, vtag: dict):
+def score_last_part(content: str, vtag: dict, cache: CountCache = None):
     last = int(vtag["part_number"])
     parts = slice_parts(content)
     spec = vtag[str(last)]
     level = spec["level"]
     relation = spec["relation"]
     target_raw = spec["target"]
-    actual = measure(level, parts.get(last, ""))
+    actual = measure(level, parts.get(last, ""), cache)
     target = parse_target(relation, target_raw)
     score = float(hard_metric(relation, actual, target))
     return score, actual, target_raw, level, relation
 
-def evaluate_model_file(model_jsonl: pathlib.Path):
+def evaluate_model_file(model_jsonl: pathlib.Path, cache: CountCache = None):
     model_name = model_jsonl.stem
     per_prompt = load_model_outputs(model_jsonl)
+    # the normalized layout keeps each prompt's verification in its prompts table
+    prompts = load_prompts_table(model_jsonl)
 
     prompt_avg_scores = {}
     prompt_details = {}
     per_output = []
 
     for pid, records in per_prompt.items():
-        vtag = records[0]["verification"]
+        vtag = records[0].get("verification") or prompts[pid]["verification"]
 
         sample_scores = []
         sample_records = []
 
         for j, obj in enumerate(records, start=1):
             content = obj["output"]
-            score, actual, target_raw, level, relation = score_last_part(content, vtag)
+            score, actual, target_raw, level, relation = score_last_part(content, vtag, cache)
 
             sample_scores.append(score)
             sample_records.append({
@@ -113,15 +119,24 @@ def evaluate_model_file(model_jsonl: pathlib.Path):
     }
 
 def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cache", type=pathlib.Path, help="SQLite file that keeps part counts between runs")
+    args = parser.parse_args()
+
+    cache = CountCache(args.cache) if args.cache else None
     results = []
-    for mf in MODEL_FILES:
-        if not mf.exists():
-            print(f"[skip] {mf} not found (cwd={os.getcwd()})")
-            continue
-        res = evaluate_model_file(mf)
-        results.append(res)
-        out_path = OUTDIR / f"{res['model']}_eval.json"
-        out_path.write_text(json.dumps(res, ensure_ascii=False, indent=2), encoding="utf-8")
+    try:
+        for mf in MODEL_FILES:
+            if not mf.exists():
+                print(f"[skip] {mf} not found (cwd={os.getcwd()})")
+                continue
+            res = evaluate_model_file(mf, cache)
+            results.append(res)
+            out_path = OUTDIR / f"{res['model']}_eval.json"
+            out_path.write_text(json.dumps(res, ensure_ascii=False, indent=2), encoding="utf-8")
+    finally:
+        if cache:
+            cache.close()
 
     if not results:
         print("No model files processed.")
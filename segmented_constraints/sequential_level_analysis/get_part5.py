@@ -2,6 +2,10 @@ import json
 import pathlib
 from collections import defaultdict
 
+import numpy as np
+
+from helpers.eval_files import fresh_part_table
+
 # input eval folder
 EVAL_DIR = pathlib.Path("..") / "eval"
 
@@ -29,6 +33,15 @@ def extract_last_part_scores(eval_json):
     return scores
 
 
+def extract_last_part_scores_columnar(table):
+    # same as extract_last_part_scores, read from the part table
+    sel = (table["part"] == LAST_PART) & np.isin(table["prompt_id"], list(TARGET_PROMPTS))
+    scores = defaultdict(list)
+    for pid, hard_score in zip(table["prompt_id"][sel].tolist(), table["hard"][sel].tolist()):
+        scores[pid].append(hard_score)
+    return scores
+
+
 def main():
     eval_files = list(EVAL_DIR.glob("*_eval.json"))
 
@@ -39,11 +52,16 @@ def main():
     final_summary = {}
 
     for f in eval_files:
-        with open(f, "r", encoding="utf-8") as infile:
-            data = json.load(infile)
-
-        model_name = data["model"]
-        collected = extract_last_part_scores(data)
+        table_path = fresh_part_table(f)
+        if table_path:
+            model_name = f.name[:-len("_eval.json")]
+            collected = extract_last_part_scores_columnar(np.load(table_path, mmap_mode="r"))
+        else:
+            with open(f, "r", encoding="utf-8") as infile:
+                data = json.load(infile)
+
+            model_name = data["model"]
+            collected = extract_last_part_scores(data)
 
         model_summary = {}
         for pid in sorted(collected):
@@ -0,0 +1,6 @@
+# helpers/__init__.py
+import pathlib
+
+# counting.py, metrics.py and cache.py here shadow the repository's helpers;
+# every other module (records, storage, eval_files, ...) is the repository's
+__path__.append(str(pathlib.Path(__file__).resolve().parents[3] / "helpers"))
@@ -0,0 +1,22 @@
+# helpers/cache.py
+# This directory's scripts import their own helpers package, which shadows
+# the repository's, so the shared CountCache is loaded from its file rather
+# than copied. Counts here come from this directory's counting.py, so that
+# file sets their version.
+import pathlib
+
+from helpers.shared import load_shared
+
+shared = load_shared("cache")
+
+MAX_ENTRIES = shared.MAX_ENTRIES
+COUNTER_VERSION = shared.source_version([pathlib.Path(__file__).with_name("counting.py")])
+text_digest = shared.text_digest
+
+
+class CountCache(shared.CountCache):
+    """helpers/cache.py's CountCache, versioned by this directory's counters."""
+
+    def __init__(self, path, max_entries: int = MAX_ENTRIES, version: str = COUNTER_VERSION,
+                 owner: bool = True):
+        super().__init__(path, max_entries, version, owner)
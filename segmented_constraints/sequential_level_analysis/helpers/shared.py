@@ -0,0 +1,18 @@
+# helpers/shared.py
+import importlib.util
+import pathlib
+
+# the repository's helpers package, which this directory's own one shadows
+SHARED_HELPERS = pathlib.Path(__file__).resolve().parents[3] / "helpers"
+
+
+def load_shared(name: str):
+    """The repository's helpers/<name>.py, loaded by path.
+
+    Only needed for the modules this package has a file of its own for;
+    the rest import as helpers.<name> (see __init__.py).
+    """
+    spec = importlib.util.spec_from_file_location(f"shared_{name}", SHARED_HELPERS / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,6 @@
+# tests/conftest.py
+import pathlib
+import sys
+
+# the scripts import helpers.* from the repository root; make plain `pytest tests` see it too
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1]))
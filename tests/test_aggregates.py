@@ -0,0 +1,28 @@
+# tests/test_aggregates.py
+import pathlib
+import shutil
+
+import pytest
+
+import evaluation
+from helpers.aggregates import hard_score_stats
+
+DATA = pathlib.Path(__file__).resolve().parents[1] / "segmented_constraints" / "data"
+
+
+@pytest.mark.parametrize("column, names", [
+    ("level", ["word", "paragraph", "line"]),
+    ("relation", ["range", "approx", "gte", "lte"]),
+])
+def test_hard_score_stats_from_aggregates_match_the_eval_json(tmp_path, monkeypatch, column, names):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    (tmp_path / "eval").mkdir()
+    shutil.copy(DATA / "gpt-4.1_output.jsonl", tmp_path / "data")
+    evaluation.evaluate_and_save(pathlib.Path("data/gpt-4.1_output.jsonl"), None, False, ["hard"])
+    eval_path = tmp_path / "eval" / "gpt-4.1_output_eval.json"
+    from_aggregates = hard_score_stats(eval_path, column, names)
+    (tmp_path / "eval" / "gpt-4.1_output_aggregates.json").unlink()
+    assert from_aggregates["global"][names[0]]["total"]
+    assert from_aggregates == hard_score_stats(eval_path, column, names)
+    assert hard_score_stats(tmp_path / "eval" / "missing_eval.json", column, names) is None
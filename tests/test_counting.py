@@ -0,0 +1,89 @@
+# tests/test_counting.py
+import random
+
+import pytest
+
+from helpers.counting import WORD_RE, StreamCounter, text_stats, word_count
+
+
+def regex_word_count(text: str) -> int:
+    # what word_count replaced, and must still agree with
+    return len(WORD_RE.findall(text))
+
+
+@pytest.mark.parametrize("text", [
+    "",
+    " ",
+    "\n\n",
+    "one",
+    "one two  three\nfour",
+    "Hello, world! It's a test.",
+    "snake_case and __dunder__ and _",
+    "x_y_z _leading trailing_",
+    "42 3.14 1,000 v2 2nd",
+    "a-b a/b a.b a'b",
+    "Привет мир, это тест",
+    "Γειά σου κόσμε",
+    "中文字 。ひらがな、カタカナ 한국어",
+    "naïve café — déjà vu",
+    "mixed Привет and ASCII_words 123",
+    "٢٣ Ⅻ ½ ² digits",
+    "emoji 😀 between 👍🏽 words",
+    "em—dash…ellipsis",
+    # markdown, as the models write it
+    "#part 1\n## Heading\n\nText under it.",
+    "- bullet one\n* bullet two\n+ bullet three\n1. numbered",
+    "**bold** and __also bold__ and *it* _it_",
+    "***both*** ~~struck~~ `inline_code()`",
+    "[a link](https://example.com/path_to?x=1&y=2) and <https://x.y>",
+    "![alt text](img_01.png)",
+    "```python\ndef f(x_1):\n    return x_1 * 2\n```",
+    "> quoted **bold**\n>> nested",
+    "| col_a | col b |\n|---|:---:|\n| 1 | **2** |",
+    "Привет **мир** — [ссылка](http://пример.рф) `код`",
+    "## 标题\n- 项目一\n- **粗体**文字",
+    " non breaking　spaces",
+])
+def test_word_count_matches_regex(text):
+    assert word_count(text) == regex_word_count(text)
+
+
+@pytest.mark.parametrize("alphabet", [
+    "ab_1 \n.,",
+    "абв гд_ 1\n—",
+    "αβγ δ ε.",
+    "#*-_`[]()>|!~ ab1\n",
+    "#* х_`[](\n中 ",
+    "中文字。、 ひカ",
+    "aé_ 中—😀 ١",
+])
+def test_word_count_matches_regex_on_random_text(alphabet):
+    rng = random.Random(alphabet)
+    for _ in range(2000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert word_count(text) == regex_word_count(text), repr(text)
+
+
+def random_chunks(rng, text):
+    # cut text at random points, empty chunks included
+    cuts = sorted(rng.randint(0, len(text)) for _ in range(rng.randint(0, 8)))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+@pytest.mark.parametrize("alphabet", [
+    "ab \n",
+    "ab_1 \n\n-*•\t",
+    "- x\n\n* y\r\n",
+    "аб 中 \x85\n-",
+    "a  　\n\n\n•+",
+])
+def test_stream_counter_matches_text_stats(alphabet):
+    rng = random.Random(alphabet)
+    for _ in range(2000):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 40)))
+        counter = StreamCounter()
+        fed = ""
+        for chunk in random_chunks(rng, text):
+            counter.feed(chunk)
+            fed += chunk
+            assert counter.stats() == text_stats(fed), repr(fed)
@@ -0,0 +1,73 @@
+# tests/test_incremental.py
+import io
+import pathlib
+import shutil
+
+import pytest
+
+import evaluation
+from helpers.manifest import Manifest
+from helpers.storage import open_stream, skip_to
+
+DATA = pathlib.Path(__file__).resolve().parents[1] / "segmented_constraints" / "data"
+METRICS = ["hard", "soft_basic"]
+
+
+class Unseekable(io.RawIOBase):
+    # a raw stream that, like the zstd reader, only reads forward
+    def __init__(self, data: bytes):
+        self.data, self.pos = data, 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buf):
+        n = len(self.data[self.pos:self.pos + len(buf)])
+        buf[:n] = self.data[self.pos:self.pos + n]
+        self.pos += n
+        return n
+
+
+def test_skip_to_reads_forward_when_stream_cannot_seek():
+    data = bytes(range(256)) * 9000
+    f = io.BufferedReader(Unseekable(data))
+    assert not f.seekable()
+    skip_to(f, 1_500_000)
+    assert f.read(10) == data[1_500_000:1_500_010]
+    assert list(f) == list(io.BytesIO(data[1_500_010:]))
+
+
+def evaluate(tmp_path, name, incremental):
+    evaluation.evaluate_and_save(pathlib.Path("data") / name, None, True, METRICS, incremental=incremental)
+    return {p.name: p.read_bytes() for p in (tmp_path / "eval").iterdir() if not p.name.endswith("_manifest.json")}
+
+
+@pytest.mark.parametrize("suffix", ["", ".gz", ".zst"])
+def test_incremental_runs_match_a_full_run(tmp_path, monkeypatch, capsys, suffix):
+    if suffix == ".zst":
+        pytest.importorskip("zstandard")
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "data").mkdir()
+    (tmp_path / "eval").mkdir()
+    lines = (DATA / "llama4scout_output.jsonl").read_bytes().splitlines(keepends=True)
+    name = "llama4scout_output.jsonl" + suffix
+    with open_stream(tmp_path / "data" / name, "wb") as f:
+        f.writelines(lines)
+    full = evaluate(tmp_path, name, False)
+
+    shutil.rmtree(tmp_path / "eval")
+    (tmp_path / "eval").mkdir()
+    # cut inside a prompt, with a line still half written
+    head, rest = b"".join(lines[:77]), b"".join(lines[77:])
+    with open_stream(tmp_path / "data" / name, "wb") as f:
+        f.write(head + rest[:40])
+    evaluate(tmp_path, name, True)
+    manifest = Manifest.load(tmp_path / "eval" / "llama4scout_output_manifest.json")
+    assert manifest.offset == len(head)
+    for piece in (rest[40:1000], rest[1000:]):
+        with open_stream(tmp_path / "data" / name, "ab") as f:
+            f.write(piece)
+        results = evaluate(tmp_path, name, True)
+    assert Manifest.load(tmp_path / "eval" / "llama4scout_output_manifest.json").offset == len(head + rest)
+    assert results == full
+    assert "[full run]" not in capsys.readouterr().out
@@ -0,0 +1,53 @@
+# tests/test_metrics.py
+import random
+
+import numpy as np
+import pytest
+
+from helpers.metrics import RELATION_CODES, hard_metric, hard_metric_array, parse_target, relation_codes, target_bounds
+
+
+def scalar_scores(triples):
+    return [hard_metric(relation, actual, parse_target(relation, target)) for relation, target, actual in triples]
+
+
+def array_scores(triples):
+    bounds = [target_bounds(relation, target) for relation, target, _ in triples]
+    return hard_metric_array(relation_codes([relation for relation, _, _ in triples]),
+                             np.array([actual for _, _, actual in triples]),
+                             np.array([b[0] for b in bounds]), np.array([b[1] for b in bounds])).tolist()
+
+
+def approx_edges(target: int):
+    # counts around round(0.95 * target) and round(1.05 * target)
+    for edge in (0.95 * target, 1.05 * target):
+        for actual in range(int(edge) - 2, int(edge) + 3):
+            yield "approx", str(target), actual
+
+
+@pytest.mark.parametrize("target", [
+    # 0.95 * t or 1.05 * t lands on (or within float error of) .5
+    10, 30, 50, 70, 90, 110, 130, 150, 170, 190, 210, 250, 290, 330, 370, 410, 450, 490, 510,
+])
+def test_approx_rounds_like_hard_metric_at_half(target):
+    triples = list(approx_edges(target))
+    assert array_scores(triples) == scalar_scores(triples)
+
+
+def test_hard_metric_array_matches_hard_metric_on_random_triples():
+    rng = random.Random(6)
+    triples = []
+    for _ in range(20000):
+        relation = rng.choice([*RELATION_CODES, "unknown"])
+        if relation == "range":
+            lo = rng.randint(0, 600)
+            target = f"{lo}-{lo + rng.randint(0, 200)}"
+            actual = rng.randint(max(lo - 50, 0), lo + 250)
+        else:
+            t = rng.randint(0, 1000)
+            target = str(t)
+            actual = rng.randint(max(t - 80, 0), t + 80)
+        triples.append((relation, target, actual))
+    for target in range(0, 2001):
+        triples.extend(approx_edges(target))
+    assert array_scores(triples) == scalar_scores(triples)
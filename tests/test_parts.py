@@ -0,0 +1,112 @@
+# tests/test_parts.py
+import random
+
+import pytest
+
+from helpers.counting import line_count, line_count_views, measure, measure_batch, text_stats, word_count, word_count_views
+from helpers.parts import PART_HEADER_RE, PartStreamCounter, scan_parts, slice_part_views
+
+from test_counting import random_chunks
+
+
+def slice_parts(content):
+    # what slice_part_views and scan_parts replaced, and must still agree with
+    headers = list(PART_HEADER_RE.finditer(content))
+    parts = {}
+    for j, hdr in enumerate(headers):
+        e = headers[j + 1].start() if j + 1 < len(headers) else len(content)
+        parts[int(hdr.group(1))] = content[hdr.end():e].strip()
+    return parts
+
+
+def expected_stats(content):
+    return {n: text_stats(part) for n, part in slice_parts(content).items()}
+
+
+PART_TEXTS = [
+    "",
+    "no header at all\n- x",
+    "#part 1\nfirst\n\n#part 2\n- second\n* more\n",
+    "preface\n#Part 1\r\n  a b\r\n\r\n#PART 2  \r\nc\r\n",
+    "#part 1\n\n#part 2\n",
+    "#part 1\nold\n#part 1\nnew text\n",
+    "#part\n\n3\nspread header\n#part 4 x\nnot a header\n",
+    "#part 12\n#part1\n#partial\n# part 3\n#part 5",
+    "#part 1\n  текст　с пробелами  \n\n- пункт\n#part 2\n中文 ",
+    "#part 1\r\nline one\r\nline two\r\n\r\n- item\r\n#part 2\r\n\r\n",
+    "#part 1\n#part 2\n   \n#part 3\n\t\n",
+    "#part 2\nfirst\n#part 1\nx\n#part 2\nsecond copy\n#part 2\n",
+    "#part 1\n word other \n　\n next para\x85end ",
+    "#part 1\n- item\n•　dot\n*\n\n   \n",
+]
+
+
+def random_part_text(rng):
+    pieces = ["#part 1\n", "#part 2\r\n", "#part 1\n", "\n", "\r\n", "\n\n", " ", " ", "　", "\x85",
+              "- ", "* ", "•", "ab", "чт", "中文", "_x"]
+    return "".join(rng.choice(pieces) for _ in range(rng.randint(0, 25)))
+
+
+@pytest.mark.parametrize("text", PART_TEXTS)
+def test_slice_part_views_match_slice_parts(text):
+    assert {n: view.text for n, view in slice_part_views(text).items()} == slice_parts(text)
+
+
+@pytest.mark.parametrize("text", PART_TEXTS)
+def test_scan_parts_matches_slice_parts(text):
+    assert scan_parts(text) == expected_stats(text)
+
+
+def test_scan_parts_matches_slice_parts_on_random_text():
+    rng = random.Random(2)
+    for _ in range(3000):
+        text = random_part_text(rng)
+        assert scan_parts(text) == expected_stats(text), repr(text)
+
+
+def test_batch_counters_match_scalar_counters():
+    rng = random.Random(3)
+    texts = PART_TEXTS + [random_part_text(rng) for _ in range(500)]
+    views = [view for text in texts for view in slice_part_views(text).values() if view.end > view.start]
+    parts = [view.source[view.start:view.end] for view in views]
+    assert word_count_views(views).tolist() == [word_count(p) for p in parts]
+    assert line_count_views(views).tolist() == [line_count(p) for p in parts]
+    jobs = [(rng.choice(["word", "line", "paragraph", "bullet", "char"]), view) for view in views]
+    assert measure_batch(jobs) == [measure(level, view.text) for level, view in jobs]
+
+
+@pytest.mark.parametrize("text", PART_TEXTS)
+def test_part_stream_counter_matches_slice_parts(text):
+    rng = random.Random(text)
+    for _ in range(200):
+        counter = PartStreamCounter()
+        fed = ""
+        for chunk in random_chunks(rng, text):
+            counter.feed(chunk)
+            fed += chunk
+            assert counter.stats() == expected_stats(fed), repr(fed)
+
+
+def test_part_stream_counter_on_random_text():
+    pieces = ["#part 1", "#part 2", "#PART 2 ", "#part", "#par", "3", " ", "\n", "\r\n", "- ", "*", "ab", "вд", "　"]
+    rng = random.Random(0)
+    for _ in range(3000):
+        text = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 20)))
+        counter = PartStreamCounter()
+        fed = ""
+        for chunk in random_chunks(rng, text):
+            counter.feed(chunk)
+            fed += chunk
+            assert counter.stats() == expected_stats(fed), repr(fed)
+
+
+def test_part_stream_counter_reports_finished_parts():
+    text = "#part 1\none two\n#part 2\n#part 1\n- three\n#part 3\nfour"
+    counter = PartStreamCounter()
+    for chunk in random_chunks(random.Random(1), text):
+        counter.feed(chunk)
+    assert counter.finished == [
+        (1, text_stats("one two")),
+        (2, text_stats("")),
+        (1, text_stats("- three")),
+    ]